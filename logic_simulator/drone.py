@@ -1,6 +1,5 @@
 from logic_simulator.entity import Entity
 from logic_simulator.pos import Pos
-import numpy as np
 import copy
 import logging
 
@@ -30,7 +29,7 @@ class Drone(Entity):
         self._change_target(target_wp)
 
     def go_to(self, target_wp):
-        logging.debug('Drone go_to {} {} {}'.format(target_wp.x, target_wp.y, target_wp.z))
+        logging.debug('Drone go_to %s %s %s', target_wp.x, target_wp.y, target_wp.z)
         assert target_wp.z < 30
         if not self._target_pos.equals(target_wp):
             # commanded target has changed
@@ -47,10 +46,17 @@ class Drone(Entity):
             self._continue_to_current_target()
 
 
+    def _is_idle(self) -> bool:
+        # hovering at the target
+        return self._reached_target() and self._speed == 0.0 and not self._velocity_dir.any()
+
+    def _transit_guards(self):
+        return None if self._reached_target() else [(self._target_pos, Drone.MAX_SPEED_MPS * 2.0)]
+
     def look_at(self, pos):
-        logging.debug('Drone look_at {} {} {}'.format(pos.x, pos.y, pos.z))
+        logging.debug('Drone look_at %s %s %s', pos.x, pos.y, pos.z)
         assert pos.z < 30
-        self._looking_at = copy.copy(pos)
+        self._looking_at = pos
 
     # def step(self, *args):
     #     # verify input
@@ -68,12 +74,6 @@ class Drone(Entity):
     #     else:
     #         self._continue_to_current_target()
 
-    def clone(self):
-        d = Drone(self.id, self.pos)
-        d._velocity_dir = self._velocity_dir
-        d._speed = self._speed
-        return d
-
     def predict(self, t: float) -> (Pos, float):
         '''
         Predict Drone's state in t timesteps from now
@@ -99,7 +99,7 @@ class Drone(Entity):
 
         if total_dist > dist_to_target:
             # Drone will reach target before t
-            predicted_pos = self._target_pos
+            predicted_pos = copy.copy(self._target_pos)
             predicted_speed = 0.0
 
         return predicted_pos, predicted_speed
@@ -107,27 +107,3 @@ class Drone(Entity):
     def _reached_target(self) -> bool:
         return self._pos.distance_to(self._target_pos) <= Drone.MAX_SPEED_MPS * 2.0
 
-    def _change_target(self, target_wp: Pos):
-        logging.debug("start pos {} velocity {} target_wp {}".format(self.pos, self.velocity, target_wp))
-        self._velocity_dir = np.array([target_wp.x - self._pos.x, target_wp.y - self._pos.y, target_wp.z - self._pos.z])
-        self._velocity_dir = self._velocity_dir / np.linalg.norm(self._velocity_dir)
-        self._speed = 0.0
-        self._target_pos = copy.copy(target_wp)
-        logging.debug("end pos {} velocity {} target_wp {}".format(self.pos, self.velocity, target_wp))
-
-    def _hover_in_place(self):
-        logging.debug("start pos {} velocity {} _target_pos {}".format(self.pos, self.velocity, self._target_pos))
-        self._velocity_dir = np.array([0.0, 0.0, 0.0], dtype=float)
-        self._speed = 0.0
-        # self._target_pos = self._pos
-        logging.debug("end pos {} velocity {} _target_pos {}".format(self.pos, self.velocity, self._target_pos))
-
-    def _continue_to_current_target(self):
-        logging.debug("start pos {} velocity {} _target_pos {}".format(self.pos, self.velocity, self._target_pos))
-        self._speed = max(self._speed + Drone.MAX_ACC_MPS2, Drone.MAX_SPEED_MPS)
-        self._velocity_dir = np.array(
-            [self._target_pos.x - self._pos.x, self._target_pos.y - self._pos.y, self._target_pos.z - self._pos.z])
-        self._velocity_dir = self._velocity_dir / np.linalg.norm(self._velocity_dir)
-        velocity = self._speed * self._velocity_dir
-        self._pos.add(velocity)
-        logging.debug("end pos {} velocity {} _target_pos {}".format(self.pos, self.velocity, self._target_pos))
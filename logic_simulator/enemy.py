@@ -1,8 +1,9 @@
 from logic_simulator.entity import Entity
 from logic_simulator.pos import Pos
 import numpy as np
-import random
-import copy
+
+# generator of enemies stepped on their own, a LogicSim draws from its own seeded generator
+_default_rng = np.random.default_rng()
 
 
 class Enemy(Entity):
@@ -34,19 +35,26 @@ class Enemy(Entity):
     def priority(self):
         return self._priority
 
-    def step(self):
-        offset_axis = [np.array([1.0, 0.0, 0.0]), np.array([0.0, 1.0, 0.0])]
-        offset_dir = [1, -1]
-        max_offset = Enemy.MAX_OFFSET
-        offset = max_offset * random.random() * random.choice(offset_dir) * random.choice(offset_axis)
-        assert offset is not None
-        self._pos = copy.copy(self._startpos)
+    @staticmethod
+    def jitter(rng, shape=()):
+        """
+        Offsets of enemies from their start positions, up to MAX_OFFSET along either the x or the y axis
+        rng - np.random.Generator, every offset takes 3 doubles of its stream in order
+        returns shape x 3 array
+        """
+        u = rng.random(tuple(shape) + (3,))
+        magnitude = Enemy.MAX_OFFSET * u[..., 0] * np.where(u[..., 1] < 0.5, 1.0, -1.0)
+        on_x = u[..., 2] < 0.5
+        offsets = np.zeros(tuple(shape) + (3,))
+        offsets[..., 0] = np.where(on_x, magnitude, 0.0)
+        offsets[..., 1] = np.where(on_x, 0.0, magnitude)
+        return offsets
+
+    def step(self, rng=None):
+        offset = Enemy.jitter(_default_rng if rng is None else rng)
+        self._pos = self._startpos
         self._pos.add(offset)
 
     @property
     def state(self):
         return [[self.pos.x, self.pos.y, self.pos.z], self.health, self.priority]
-
-    def clone(self):
-        e = Enemy(self.id, self.pos, self.priority, self._cep, self._tclass)
-        return e
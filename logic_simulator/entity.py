@@ -1,36 +1,80 @@
 from logic_simulator.pos import Pos
+from logic_simulator.world_state import WorldState, WorldColumn, WorldPosColumn
+from logic_simulator.los import los_matrix
+from logic_simulator import tracing
 import numpy as np
 import copy
 
 
 class Entity:
     STEP_TIME = 0.2
+    MAX_ACC_MPS2 = 0.0
+    MAX_SPEED_MPS = 0.0
+
+    # kinematic state lives in a WorldState row - see WorldState.add
+    _pos = WorldPosColumn('pos')
+    _target_pos = WorldPosColumn('target')
+    _looking_at = WorldPosColumn('looking_at')
+    _velocity_dir = WorldColumn('velocity_dir')
+    _speed = WorldColumn('speed')
+    _health = WorldColumn('health')
+    _fov = WorldColumn('fov')
+    _max_range_of_view = WorldColumn('max_range')
 
     def __init__(self, id, pos: Pos):
         self._id = id
+        self._world = None
+        self._slot = None
+        # a standalone entity owns a single slot world until a LogicSim pools it
+        WorldState(1).add(self)
         self._pos = pos
         self._startpos = copy.copy(pos)
         self._velocity_dir = np.array([0.0, 0.0, 0.0], dtype=float)
         self._speed = 0.0
         self._t = 0.0
-        self._target_pos = copy.copy(pos)
-        self._looking_at = copy.copy(pos)
+        self._target_pos = pos
+        self._looking_at = pos
         self._health = 1.0
 
     def reset(self):
-        self._pos = copy.copy(self._startpos)
+        self._pos = self._startpos
         self._velocity_dir = np.array([0.0, 0.0, 0.0], dtype=float)
         self._speed = 0.0
         self._t = 0.0
-        self._target_pos = copy.copy(self._pos)
-        self._looking_at = copy.copy(self._pos)
+        self._target_pos = self._startpos
+        self._looking_at = self._startpos
         self._health = 1.0
+        self._world.moving[self._slot] = False
 
     def predict(self, t):
         raise NotImplementedError
 
     def clone(self):
-        raise NotImplementedError
+        """
+        Detached copy of the entity in a world of its own, with the same state and start position
+        """
+        e = copy.copy(self)
+        WorldState(1).add(e)
+        return e
+
+    # state kept outside the WorldState row, see LogicSim.snapshot.
+    # subclasses append their fields after the ones of their base class
+    def _extra_state_size(self, num_enemies) -> int:
+        return 0
+
+    def _save_extra_state(self, out, enemies):
+        """
+        out - float array to write the extra state into
+        returns the rest of out
+        """
+        return out
+
+    def _restore_extra_state(self, buf, enemies):
+        """
+        buf - float array written by _save_extra_state
+        returns the rest of buf
+        """
+        return buf
 
     # def step(self, *args):
     #     raise NotImplementedError
@@ -38,28 +82,61 @@ class Entity:
     def update(self):
         raise NotImplementedError
 
-    def _is_same_args(self, *args):
-        raise NotImplementedError
-
-    def is_line_of_sight_to(self, pos):
-        range_to_target = self.pos.distance_to(pos)
-
-        is_los = range_to_target < self._max_range_of_view
-
-        if is_los:
-            range_to_look_at = self.pos.distance_to(self.looking_at)
-            direction_to_target = self.pos.direction_vector(pos)
-            direction_to_look_at = self.pos.direction_vector(self.looking_at)
+    # used by LogicSim.step_to_event to skip ticks where update() is predictable
+    def _is_idle(self) -> bool:
+        """
+        True when update() leaves the entity's state as it is
+        """
+        return False
 
-            # cos alpha = A dot B / (norm A * norm B)
-            cos_angle = np.dot(direction_to_target, direction_to_look_at) / (range_to_target * range_to_look_at)
+    def _transit_guards(self):
+        """
+        When update() keeps moving the entity straight to its target, the (Pos, radius) pairs
+        it has to stay farther than for that to go on. None otherwise
+        """
+        return None
 
-            # first quarter  - cos function decreasing
-            is_los = cos_angle > np.cos(self._fov)
+    def _is_same_args(self, *args):
+        raise NotImplementedError
 
-        return is_los
+    def _change_target(self, target_wp: Pos):
+        self._velocity_dir = np.array([target_wp.x - self._pos.x, target_wp.y - self._pos.y, target_wp.z - self._pos.z])
+        self._velocity_dir = self._velocity_dir / np.linalg.norm(self._velocity_dir)
+        self._speed = 0.0
+        self._target_pos = target_wp
+        if tracing.tracer is not None:
+            tracing.tracer.record(tracing.CHANGE_TARGET, self)
 
+    def _hover_in_place(self):
+        self._velocity_dir = np.array([0.0, 0.0, 0.0], dtype=float)
+        self._speed = 0.0
+        self._world.moving[self._slot] = False
+        # self._target_pos = self._pos
+        if tracing.tracer is not None:
+            tracing.tracer.record(tracing.HOVER_IN_PLACE, self)
+
+    def _continue_to_current_target(self):
+        if self._world.batched:
+            # WorldState.advance moves all flagged entities at the end of the step, recorded before they move
+            self._world.moving[self._slot] = True
+            if tracing.tracer is not None:
+                tracing.tracer.record(tracing.CONTINUE_TO_TARGET, self)
+            return
+        self._speed = max(self._speed + self.MAX_ACC_MPS2, self.MAX_SPEED_MPS)
+        self._velocity_dir = np.array(
+            [self._target_pos.x - self._pos.x, self._target_pos.y - self._pos.y, self._target_pos.z - self._pos.z])
+        self._velocity_dir = self._velocity_dir / np.linalg.norm(self._velocity_dir)
+        velocity = self._speed * self._velocity_dir
+        self._pos.add(velocity)
+        if tracing.tracer is not None:
+            tracing.tracer.record(tracing.CONTINUE_TO_TARGET, self)
 
+    def is_line_of_sight_to(self, pos):
+        # single pair of logic_simulator.los.los_matrix
+        world = self._world
+        slots = slice(self._slot, self._slot + 1)
+        return bool(los_matrix(world.pos[slots], world.looking_at[slots], world.max_range[slots], world.fov[slots],
+                               [[pos.x, pos.y, pos.z]])[0, 0])
 
     @property
     def id(self):
@@ -67,8 +144,8 @@ class Entity:
 
     @property
     def state(self):
-        return np.array([[self.pos.x, self.pos.y, self.pos.z], self.velocity,
-                         [self.looking_at.x, self.looking_at.y, self.looking_at.z], self.health])
+        return np.array([self.pos.x, self.pos.y, self.pos.z, *self.velocity,
+                         self.looking_at.x, self.looking_at.y, self.looking_at.z, self.health])
 
     @property
     def pos(self) -> Pos:
@@ -91,6 +168,6 @@ class Entity:
         return self._looking_at
 
     def __str__(self):
-        return "Pos: ({X}, {Y}, {Z}) Velocity: ({Vx}, {Vy}, {Vz})".format(X=self.pos.X, Y=self.pos.Y, Z=self.pos.Z,
+        return "Pos: ({X}, {Y}, {Z}) Velocity: ({Vx}, {Vy}, {Vz})".format(X=self.pos.x, Y=self.pos.y, Z=self.pos.z,
                                                                           Vx=self.velocity[0], Vy=self.velocity[1],
                                                                           Vz=self.velocity[2])
@@ -1,20 +1,23 @@
 import time
+import hashlib
 
 import numpy as np
-import random
 from logic_simulator.drone import Drone
 from logic_simulator.ugv import Ugv
 from logic_simulator.sensor_drone import SensorDrone
 from logic_simulator.suicide_drone import SuicideDrone
 from logic_simulator.pos import Pos
 from logic_simulator.enemy import Enemy
+from logic_simulator.world_state import WorldState
+from logic_simulator.los import los_matrix
+from logic_simulator.spatial_index import UniformGrid
+from logic_simulator import tracing
+from logic_simulator.renderer import Renderer
+from logic_simulator.recorder import EpisodeRecorder
 import copy
 from itertools import chain
 import gym
 import logging
-from mpl_toolkits.mplot3d import Axes3D
-import matplotlib.pyplot as plt
-import matplotlib
 
 
 class LogicSim(gym.Env):
@@ -23,14 +26,29 @@ class LogicSim(gym.Env):
     NUM_OF_ENTITIES = 3
     NUM_OF_ENEMIES = 1
     EPSILON = 5.0
+    GRID_CELL_SIZE = Drone.MAX_RANGE_OF_VIEW  # meters
+    # above this many entity x enemy pairs LOS is only computed for pairs the enemies grid finds in range
+    DENSE_LOS_MAX_PAIRS = 256
     ACTIONS_TO_METHODS = {
         'MOVE_TO': {SuicideDrone: Drone.go_to, SensorDrone: Drone.go_to},
         'LOOK_AT': {SuicideDrone: Drone.look_at, SensorDrone: Drone.look_at, Ugv: Ugv.look_at},
         'ATTACK': {SuicideDrone: SuicideDrone.attack, Ugv: Ugv.attack},
         'TAKE_PATH': {Ugv: Ugv.go_to}
     }
+    # numeric action codes, see actions_from_array
+    ACTIONS = list(ACTIONS_TO_METHODS.keys())
+    NO_ACTION = -1
+    ATTACK = ACTIONS.index('ATTACK')
+    TAKE_PATH = ACTIONS.index('TAKE_PATH')
 
-    FIG = plt.figure()
+    metadata = {'render.modes': ['human', 'rgb_array']}
+
+    # flat observation (float32, positions relative to the observation origin), see flat_observation:
+    #   per entity  - pos(3), velocity(3), look_at(3), health(1)
+    #   per enemy   - pos(3), health(1), priority(1)
+    #   match_los   - entities x enemies line of sight flags, row per entity
+    ENTITY_FEATURES = 10
+    ENEMY_FEATURES = 5
 
     observation_space = gym.spaces.Tuple([
         gym.spaces.Tuple([  # Entities obs
@@ -57,15 +75,138 @@ class LogicSim(gym.Env):
         in range(NUM_OF_ENTITIES)
     ])
 
-    def __init__(self, entities: dict, enemies=[]):
+    def __init__(self, entities: dict, enemies=[], batch_kinematics=False, seed=None, flat_obs=False, origin=None,
+                 reuse_obs=False):
+        """
+        batch_kinematics - integrate the motion of all entities with one vectorized
+                WorldState.advance per step instead of moving them one by one
+        seed - seed of the enemies random behaviour, see seed()
+        flat_obs - reset and step return flat_observation() instead of the nested
+                entities state, enemies state, match_los tuple, a new array every time
+        reuse_obs - with flat_obs, return the preallocated flat_observation() buffer itself, overwritten
+                by the next reset or step. For callers that are done with an observation before stepping again
+        origin - metric position subtracted from positions of the flat observation, defaults to the
+                start position of the first entity
+        """
+        self.seed(seed)
         self._entities = entities
         self._enemies = enemies
+        self._flat_obs = flat_obs
+        self._reuse_obs = reuse_obs
+        first = next(iter(entities.values()), None)
+        if origin is not None:
+            self._origin = np.array([origin.x, origin.y, origin.z])
+        elif first is not None:
+            self._origin = np.array([first._startpos.x, first._startpos.y, first._startpos.z])
+        else:
+            self._origin = np.zeros(3)
+        self._bind_world(WorldState.pool(chain(entities.values(), enemies)))
+        self._world.batched = batch_kinematics
+        self._los_matrix = np.zeros((len(entities), len(enemies)), dtype=bool)
+        self._enemies_grid = UniformGrid(LogicSim.GRID_CELL_SIZE)
+        self._update_enemies_grid()
         self._step = 0
-        self._entities_not_commanded = []
-        self._fig = LogicSim.FIG
-        self._ax = self._fig.add_subplot(111, projection='3d')
-        self._scatter = None
-        matplotlib.interactive(True)
+        self._entity_list = list(entities.values())
+        self._entity_index = {e.id: i for i, e in enumerate(self._entity_list)}
+        # per entity, the method of every action code, None where its type does not have the action
+        self._action_methods = [[LogicSim.ACTIONS_TO_METHODS[a].get(e.__class__) for a in LogicSim.ACTIONS]
+                                for e in self._entity_list]
+        # entities that got a command in the current step
+        self._commanded = np.zeros(len(self._entity_list), dtype=bool)
+        # created on first render
+        self._renderer = None
+        self._recorder = None
+
+    def _bind_world(self, world: WorldState):
+        # entities and enemies must already be slots of world
+        self._world = world
+        self._entity_slots = np.array([e._slot for e in self._entities.values()], dtype=int)
+        self._enemy_slots = np.array([e._slot for e in self._enemies], dtype=int)
+        self._slots = np.concatenate([self._entity_slots, self._enemy_slots])
+        self._enemy_start = np.array([[e._startpos.x, e._startpos.y, e._startpos.z] for e in self._enemies],
+                                     dtype=float).reshape(-1, 3)
+        # snapshot layout: step, WorldState rows of self._slots, extra state of every entity and enemy
+        self._snapshot_rows_end = 1 + len(self._slots) * WorldState.WIDTH
+        self._snapshot_size = self._snapshot_rows_end + sum(
+            e._extra_state_size(len(self._enemies)) for e in chain(self._entities.values(), self._enemies))
+        self._allocate_flat_obs()
+
+    def _allocate_flat_obs(self):
+        # the flat observation buffer and its per section views, reused by every flat_observation call
+        num_entities, num_enemies = len(self._entities), len(self._enemies)
+        entity_end = num_entities * LogicSim.ENTITY_FEATURES
+        enemy_end = entity_end + num_enemies * LogicSim.ENEMY_FEATURES
+        self._obs = np.zeros(enemy_end + num_entities * num_enemies, dtype=np.float32)
+        self._entities_obs = self._obs[:entity_end].reshape(num_entities, LogicSim.ENTITY_FEATURES)
+        self._enemies_obs = self._obs[entity_end:enemy_end].reshape(num_enemies, LogicSim.ENEMY_FEATURES)
+        self._los_obs = self._obs[enemy_end:].reshape(num_entities, num_enemies)
+        self._enemies_obs[:, 4] = [e.priority for e in self._enemies]
+        if self._flat_obs:
+            self.observation_space = self.flat_observation_space
+
+    @property
+    def world(self) -> WorldState:
+        return self._world
+
+    @property
+    def entity_slots(self):
+        """
+        WorldState slots of the entities, in self.entities order
+        """
+        return self._entity_slots
+
+    @property
+    def enemy_slots(self):
+        return self._enemy_slots
+
+    @property
+    def step_count(self):
+        return self._step
+
+    @property
+    def origin(self):
+        """
+        metric position the flat observation positions are relative to, the center of action_space targets
+        """
+        return self._origin
+
+    def seed(self, seed=None):
+        """
+        Seed the random streams of the simulator, episode k (the k-th reset from now) draws from
+        its own generator spawned from seed and k, so it does not depend on the episodes before it
+        returns [seed entropy]
+        """
+        self._seed_sequence = np.random.SeedSequence(seed)
+        self._episode = -1
+        self._rng = np.random.default_rng(self._seed_sequence)
+        return [self._seed_sequence.entropy]
+
+    @property
+    def rng(self) -> np.random.Generator:
+        """
+        generator of the current episode
+        """
+        return self._rng
+
+    @property
+    def recorder(self) -> EpisodeRecorder:
+        return self._recorder
+
+    @recorder.setter
+    def recorder(self, recorder: EpisodeRecorder):
+        """
+        Record every episode from the next reset (or step) on, None to stop recording
+        """
+        if self._recorder is not None and self._recorder is not recorder:
+            self._recorder.end_episode()
+        self._recorder = recorder
+
+    @property
+    def los_matrix(self):
+        """
+        entities x enemies line of sight flags of the last observation, in self.entities and self.enemies order
+        """
+        return self._los_matrix
 
     @property
     def enemies(self):
@@ -77,36 +218,44 @@ class LogicSim(gym.Env):
 
     def reset(self):
         self._step = 0
+        self._episode += 1
+        self._rng = np.random.default_rng(
+            np.random.SeedSequence(self._seed_sequence.entropy, spawn_key=(self._episode,)))
         for e in chain(self._entities.values(), self._enemies):
             e.reset()
-        return self._get_obs()
-
-    def _marker_from_entity(self, e):
-        return "o" if isinstance(e, Ugv) else "^" if isinstance(e, SuicideDrone) else "*"
-
-    def render(self, mode='human'):
-        positions = [(e.pos.x, e.pos.y, e.pos.z,
-                      'r' if isinstance(e, Enemy) else 'm' if isinstance(e, Ugv) else 'g' if isinstance(e,
-                                                                                                        SuicideDrone) else 'b',
-                      self._marker_from_entity(e)) for e in
-                     chain(self._entities.values(), self._enemies)]
-        res = list(zip(*positions))
-        if self._scatter is not None:
-            self._ax.cla()
-        self._scatter = self._ax.scatter(res[0], res[1], res[2], c=res[3], marker='o')
+        self._update_enemies_grid()
+        obs = self._get_obs()
+        if self._recorder is not None:
+            self._recorder.begin_episode(self)
+        return obs
 
-        self._ax.set_xlabel('X')
-        self._ax.set_ylabel('Y')
-        self._ax.set_zlabel('Z')
+    @property
+    def renderer(self) -> Renderer:
+        return self._renderer
 
-        self._ax.set_xlim(-100.0, 200.0)
-        self._ax.set_ylim(-400.0, 100.0)
-        self._ax.set_zlim(-1.0, 30.0)
+    @renderer.setter
+    def renderer(self, renderer: Renderer):
+        """
+        Replace the default renderer, e.g. Renderer(sim, headless=True, every=10, sink=FrameSink('run.npz'))
+        """
+        if self._renderer is not None and self._renderer is not renderer:
+            self._renderer.close()
+        self._renderer = renderer
 
-        # self._ax.legend()
+    def render(self, mode='human'):
+        """
+        mode - 'human' draws on a window, 'rgb_array' returns the frame as an array
+        """
+        if self._renderer is None:
+            self._renderer = Renderer(self, headless=(mode != 'human'))
+        return self._renderer.render(mode)
 
-        plt.draw()
-        plt.pause(0.1)
+    def close(self):
+        if self._renderer is not None:
+            self._renderer.close()
+            self._renderer = None
+        if self._recorder is not None:
+            self._recorder.end_episode()
 
     def step(self, actions):
         """
@@ -115,32 +264,181 @@ class LogicSim(gym.Env):
                     'LOOK_AT':[{'SensorDrone': (target_wp3)}],
                     'ATTACK':[],
                     'TAKE_PATH':[{'UGV':('Path1',target_wp3)}]}
+                or an action array (see actions_from_array), executed without building the dictionary
 
         """
-        self._step += 1
+        self._begin_step(actions)
+
+        self._world.advance()
+
+        self._end_step()
+
+        obs = self._get_obs()
+        if self._recorder is not None:
+            self._recorder.record(self, actions)
+        return obs, self.reward(), self.is_done(), {}
 
-        # entities_not_commanded = copy.deepcopy(self._entities)
+    def step_to_event(self, actions, max_ticks=None):
+        """
+        Like step, then keeps advancing time in one jump for as long as no event can happen:
+        no entity reaches a waypoint, an attack position or the line of sight range of an enemy.
+        Entities continue their commands during the jump as not commanded entities do,
+        so the observation is the one step({}) calls would return at the same tick
+        max_ticks - optional bound on the ticks advanced
+        returns obs, reward, done, info with info['ticks'] the number of ticks advanced
+        """
+        assert max_ticks is None or max_ticks >= 1
+        self._begin_step(actions)
+        self._world.advance()
+        self._end_step()
+
+        ticks = 1
+        if not self.is_done():
+            limit = LogicSim.MAX_STEPS - self._step
+            if max_ticks is not None:
+                limit = min(limit, max_ticks - 1)
+            skipped, transit_slots = self._ticks_to_event(limit)
+            if skipped > 0:
+                self._world.advance_ticks(transit_slots, skipped)
+                # draws the enemies offsets of every skipped tick, as step() would
+                self._update_enemies(skipped)
+                self._update_enemies_grid()
+                self._step += skipped
+                ticks += skipped
+
+        obs = self._get_obs()
+        if self._recorder is not None:
+            self._recorder.record(self, actions)
+        return obs, self.reward(), self.is_done(), {'ticks': ticks}
+
+    def _ticks_to_event(self, limit):
+        # number of ticks (up to limit) that can be skipped and the slots moving during them
+        if limit <= 0:
+            return 0, None
+        ticks = np.arange(limit + 1, dtype=float)
+        entities = list(self._entities.values())
+        travel = np.zeros((len(entities), len(ticks)))
+        transit = np.zeros(len(entities), dtype=bool)
+        first_event = limit
+        for i, e in enumerate(entities):
+            if e._is_idle():
+                continue
+            guards = e._transit_guards()
+            if guards is None:
+                return 0, None
+            transit[i] = True
+            travel[i] = self._world.transit_distance(self._entity_slots[i:i + 1], ticks)[0]
+            for pos, radius in guards:
+                # a guard is checked by update() before moving, ticks 0 .. k - 1
+                first_event = min(first_event, LogicSim._first_false(e.pos.distance_to(pos) - travel[i] > radius))
+
+        if len(self._enemies) > 0:
+            world = self._world
+            entities_pos = world.pos[self._entity_slots]
+            enemies_pos = world.pos[self._enemy_slots]
+            # living enemies jitter up to Enemy.MAX_OFFSET around their start position
+            margin = np.where(world.health[self._enemy_slots] > 0.0, 2.0 * Enemy.MAX_OFFSET, 0.0)
+            clearance = np.linalg.norm(enemies_pos[np.newaxis] - entities_pos[:, np.newaxis], axis=2) - margin
+            clearance = clearance.min(axis=1) - world.max_range[self._entity_slots]
+            # out of range of every enemy on ticks 0 .. k
+            out_of_range = (clearance[:, np.newaxis] - travel > 0.0).all(axis=0)
+            first_event = min(first_event, LogicSim._first_false(out_of_range) - 1)
+
+        return max(first_event, 0), self._entity_slots[transit]
+
+    @staticmethod
+    def _first_false(flags):
+        return int(np.argmin(flags)) if not flags.all() else len(flags)
+
+    def _begin_step(self, actions):
+        # everything in a step up to moving the entities
+        self._step += 1
+        if tracing.tracer is not None:
+            tracing.tracer.step = self._step
 
-        self._entities_not_commanded = [*self.entities]
+        self._commanded[:] = False
 
-        self._execute_entities_actions(actions)
+        if isinstance(actions, dict):
+            self._execute_entities_actions(actions)
+        else:
+            self._execute_action_array(actions)
 
         self._update_not_commanded()
 
+    def _end_step(self):
+        # everything in a step after the entities moved
         self._update_enemies()
+        self._update_enemies_grid()
+
+    def actions_from_array(self, action_array):
+        """
+        action_array - one (action code, x, y, z, path index) row per entity, in self.entities order.
+                action code indexes LogicSim.ACTIONS, LogicSim.NO_ACTION leaves the entity not commanded.
+                x, y, z are metric coordinates of the target,
+                path index selects the TAKE_PATH path from sorted(Ugv.paths)
+        returns the same actions as a dictionary for step()
+        """
+        assert len(action_array) == len(self._entities), 'expected one action row per entity'
+        path_ids = sorted(Ugv.paths.keys())
+        actions = {}
+        for entity, row in zip(self.entities, action_array):
+            code = int(row[0])
+            if code == LogicSim.NO_ACTION:
+                continue
+            action_name = LogicSim.ACTIONS[code]
+            target = Pos.from_xyz(row[1], row[2], row[3])
+            params = (path_ids[int(row[4])], target) if action_name == 'TAKE_PATH' else (target,)
+            actions.setdefault(action_name, []).append({entity.id: params})
+        return actions
+
+    @property
+    def flat_observation_space(self):
+        return gym.spaces.Box(low=-np.inf, high=np.inf, shape=self._obs.shape, dtype=np.float32)
 
-        return self._get_obs(), self.reward(), self.is_done(), {}
+    @staticmethod
+    def write_flat_obs(world: WorldState, entity_slots, enemy_slots, origin, entities_out, enemies_out):
+        """
+        Write the entities and enemies sections of flat observations, enemies priority excluded
+        entity_slots, enemy_slots - slots arrays, any leading dimensions (e.g. one row per episode)
+        entities_out, enemies_out - slots shape x ENTITY_FEATURES and slots shape x ENEMY_FEATURES views
+        """
+        entities_out[..., 0:3] = world.pos[entity_slots] - origin
+        entities_out[..., 3:6] = world.speed[entity_slots][..., np.newaxis] * world.velocity_dir[entity_slots]
+        entities_out[..., 6:9] = world.looking_at[entity_slots] - origin
+        entities_out[..., 9] = world.health[entity_slots]
+        enemies_out[..., 0:3] = world.pos[enemy_slots] - origin
+        enemies_out[..., 3] = world.health[enemy_slots]
+
+    def flat_observation(self):
+        """
+        Observation as one float32 vector in the layout of ENTITY_FEATURES and ENEMY_FEATURES.
+        The vector is preallocated and overwritten by the next call, copy it to keep it
+        """
+        LogicSim.write_flat_obs(self._world, self._entity_slots, self._enemy_slots, self._origin,
+                                self._entities_obs, self._enemies_obs)
+        self._los_obs[...] = self.compute_los_matrix()
+        return self._obs
 
     def _get_obs(self):
+        if self._flat_obs:
+            return self.flat_observation() if self._reuse_obs else self.flat_observation().copy()
         match_los = self._compute_all_los()
         entities_state = [e.state for e in self._entities.values()]
         enemies_state = [e.state for e in self._enemies]
         return entities_state, enemies_state, match_los
 
-    def _update_enemies(self):
-        # perform step() to living enemies
-        for e in [enemy for enemy in self._enemies if enemy.is_alive]:
-            e.step()
+    def _update_enemies_grid(self):
+        # enemies positions only change in _update_enemies and reset
+        self._enemies_grid.rebuild(self._world.pos[self._enemy_slots])
+
+    def _update_enemies(self, ticks=1):
+        # Enemy.step of the living enemies, for all of them at once. Only the offsets of the last tick stay,
+        # the ones of the ticks before are drawn to keep the random stream as ticks calls would
+        alive = self._world.health[self._enemy_slots] > 0.0
+        if not alive.any():
+            return
+        offsets = Enemy.jitter(self._rng, (ticks, np.count_nonzero(alive)))
+        self._world.pos[self._enemy_slots[alive]] = self._enemy_start[alive] + offsets[-1]
 
     def _execute_entities_actions(self, actions):
         for action_name, ent_params_list in actions.items():
@@ -151,7 +449,7 @@ class LogicSim(gym.Env):
                     assert entity_id in self._entities.keys(), \
                         'self._entities does not have key {}'.format(str(entity_id))
                     # entity got a new command - remove from not commanded
-                    self._entities_not_commanded = [ent for ent in self._entities_not_commanded if ent.id != entity_id]
+                    self._commanded[self._entity_index[entity_id]] = True
                     # extract entity
                     entity = self._entities[entity_id]
                     # extract method
@@ -161,11 +459,34 @@ class LogicSim(gym.Env):
                     # execute entities method with params
                     method(entity, *params)
 
+    def _execute_action_array(self, action_array):
+        # the actions_from_array rows executed through the per entity method tables
+        action_array = np.asarray(action_array, dtype=float)
+        assert len(action_array) == len(self._entity_list), 'expected one action row per entity'
+        codes = np.asarray(action_array[:, 0], dtype=int)
+        commanded = codes != LogicSim.NO_ACTION
+        self._commanded |= commanded
+        for i in np.flatnonzero(commanded):
+            code = codes[i]
+            method = self._action_methods[i][code]
+            entity = self._entity_list[i]
+            assert method is not None, '{} can not {}'.format(entity.id, LogicSim.ACTIONS[code])
+            row = action_array[i]
+            target = Pos.from_xyz(row[1], row[2], row[3])
+            if code == LogicSim.ATTACK:
+                params = self._parse_attack_params((target,))
+            elif code == LogicSim.TAKE_PATH:
+                params = (sorted(Ugv.paths.keys())[int(row[4])], target)
+            else:
+                params = (target,)
+            method(entity, *params)
+
     def _parse_attack_params(self, params):
         assert isinstance(params, tuple), 'params should be tuple'
         assert isinstance(params[0], Pos), "ATTACK gets a Pos to attack"
         pos = params[0]
-        enemies_in_danger = [e for e in self._enemies if e.pos.distance_to(pos) < LogicSim.EPSILON]
+        enemies_in_danger = [self._enemies[i] for i in
+                             self._enemies_grid.query_radius([pos.x, pos.y, pos.z], LogicSim.EPSILON)]
         param_list = list(params)
         param_list.append(enemies_in_danger)
         params = tuple(param_list)
@@ -177,27 +498,115 @@ class LogicSim(gym.Env):
     def is_done(self):
         return self._step >= LogicSim.MAX_STEPS or len(self._enemies) == 0
 
+    def compute_los_matrix(self):
+        """
+        Line of sight of every entity to every enemy, see logic_simulator.los.los_matrix
+        """
+        world = self._world
+        entity_slots = self._entity_slots
+        if len(entity_slots) * len(self._enemy_slots) <= LogicSim.DENSE_LOS_MAX_PAIRS:
+            self._los_matrix = los_matrix(world.pos[entity_slots], world.looking_at[entity_slots],
+                                          world.max_range[entity_slots], world.fov[entity_slots],
+                                          world.pos[self._enemy_slots])
+            return self._los_matrix
+
+        # cull by range, then run the kernel on the remaining pairs only, one pair per batch row
+        i, j = self._enemies_grid.query_pairs(world.pos[entity_slots], world.max_range[entity_slots])
+        observers = entity_slots[i]
+        enemies = self._enemy_slots[j]
+        in_los = los_matrix(world.pos[observers, np.newaxis], world.looking_at[observers, np.newaxis],
+                            world.max_range[observers, np.newaxis], world.fov[observers, np.newaxis],
+                            world.pos[enemies, np.newaxis])
+        self._los_matrix = np.zeros((len(entity_slots), len(self._enemy_slots)), dtype=bool)
+        self._los_matrix[i, j] = in_los[:, 0, 0]
+        return self._los_matrix
+
     def _compute_all_los(self):
+        los = self.compute_los_matrix()
+        entities = list(self._entities.values())
         match_los = {}
-        for enemy in self._enemies:
-            match_los[enemy.id] = [entity for entity in self._entities.values() if
-                                   entity.is_line_of_sight_to(enemy.pos)]
+        for j, enemy in enumerate(self._enemies):
+            match_los[enemy.id] = [entities[i] for i in np.flatnonzero(los[:, j])]
             if len(match_los[enemy.id]) > 0:
-                logging.info('{} in line of sight !!!'.format(enemy.id))
+                logging.info('%s in line of sight !!!', enemy.id)
         return match_los
 
-    def clone(self):
-        entities = {}
-        for k, v in self._entities.items():
-            entities[k] = v.clone()
-        enemies = []
-        for i, e in enumerate(self._enemies):
-            enemies[i] = e.clone()
-        return LogicSim(entities, enemies)
+    @property
+    def snapshot_size(self):
+        return self._snapshot_size
+
+    def state_key(self, cell_size=5.0, health_levels=4):
+        """
+        Digest of the state discretized for search transpositions: the step, the cell_size grid cells of the
+        entities positions, targets and look at points, the extra state of the entities and enemies
+        (Ugv path and waypoint indices, attack state, see snapshot) and health_levels levels of health.
+        A 16 bytes blake2b digest, unlike hash() it is the same in every process and run.
+        Enemies positions are left out, they only jitter around their start positions
+        """
+        world = self._world
+        slots = self._entity_slots
+        cells = np.floor(np.concatenate([world.pos[slots], world.target[slots], world.looking_at[slots]]) / cell_size)
+        health = np.ceil(world.health[self._slots] * health_levels)
+        rest = np.empty(self._snapshot_size - self._snapshot_rows_end, dtype=float)
+        buf = rest
+        for e in chain(self._entities.values(), self._enemies):
+            buf = e._save_extra_state(buf, self._enemies)
+        digest = hashlib.blake2b(np.int64(self._step).tobytes(), digest_size=16)
+        for part in (cells, health, rest):
+            digest.update(part.tobytes())
+        return digest.digest()
+
+    def snapshot(self, out=None):
+        """
+        Full simulator state as a flat float array, see restore
+        out - optional preallocated array of snapshot_size to write into instead of allocating
+        """
+        if out is None:
+            out = np.empty(self._snapshot_size, dtype=float)
+        assert out.shape == (self._snapshot_size,), 'snapshot buffer should have {} items'.format(self._snapshot_size)
+        out[0] = self._step
+        self._world.get_rows(self._slots, out=out[1:self._snapshot_rows_end].reshape(-1, WorldState.WIDTH))
+        rest = out[self._snapshot_rows_end:]
+        for e in chain(self._entities.values(), self._enemies):
+            rest = e._save_extra_state(rest, self._enemies)
+        return out
+
+    def restore(self, snapshot):
+        """
+        Bring the simulator back in place to the state a snapshot was taken at
+        snapshot - array returned by snapshot() of this simulator (or a clone of it)
+        """
+        assert len(snapshot) == self._snapshot_size, 'snapshot does not match this LogicSim'
+        self._step = int(snapshot[0])
+        self._world.set_rows(self._slots, snapshot[1:self._snapshot_rows_end].reshape(-1, WorldState.WIDTH))
+        rest = snapshot[self._snapshot_rows_end:]
+        for e in chain(self._entities.values(), self._enemies):
+            rest = e._restore_extra_state(rest, self._enemies)
+        self._update_enemies_grid()
+
+    def clone(self, flat_obs=None, reuse_obs=None):
+        """
+        flat_obs, reuse_obs - observation mode of the clone, defaults to the mode of this simulator
+        """
+        entities = {k: v.clone() for k, v in self._entities.items()}
+        enemies = [e.clone() for e in self._enemies]
+        sim = LogicSim(entities, enemies, batch_kinematics=self._world.batched,
+                       flat_obs=self._flat_obs if flat_obs is None else flat_obs,
+                       reuse_obs=self._reuse_obs if reuse_obs is None else reuse_obs)
+        sim._origin = self._origin
+        # the clone continues the random stream of this simulator
+        sim._seed_sequence, sim._episode = self._seed_sequence, self._episode
+        sim._rng.bit_generator.state = self._rng.bit_generator.state
+        # rebinds the attack state of the cloned suicide drones to the cloned enemies
+        sim.restore(self.snapshot())
+        return sim
 
     @property
     def state(self):
-        return np.array([ent.state for ent in self._entities.values() + self._enemies])
+        """
+        copy of the flat observation of the current state
+        """
+        return self.flat_observation().copy()
 
     def __str__(self):
         s = 'LogicSim state \n'
@@ -207,6 +616,6 @@ class LogicSim(gym.Env):
         return str(s)
 
     def _update_not_commanded(self):
-        for e in self._entities_not_commanded:
-            e.update()
+        for i in np.flatnonzero(~self._commanded):
+            self._entity_list[i].update()
 
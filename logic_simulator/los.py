@@ -0,0 +1,29 @@
+import numpy as np
+
+
+def los_matrix(observers, looking_at, max_range, fov, targets):
+    """
+    Line of sight of every observer to every target in one broadcast operation.
+    A target is seen when it is closer than the observer's max range and inside its field of view,
+    the cone of half angle fov around the direction the observer is looking at.
+    Leading batch dimensions are broadcast, e.g. one row per episode.
+
+    observers, looking_at - ... x N x 3 metric positions
+    max_range, fov - ... x N range of view (meters) and field of view (radians)
+    targets - ... x M x 3 metric positions
+    returns ... x N x M bool matrix
+    """
+    observers = np.asarray(observers, dtype=float)
+    to_target = np.asarray(targets, dtype=float)[..., np.newaxis, :, :] - observers[..., :, np.newaxis, :]
+    to_look_at = np.asarray(looking_at, dtype=float) - observers
+    range_to_target = np.sqrt(np.einsum('...k,...k->...', to_target, to_target))
+    range_to_look_at = np.sqrt(np.einsum('...k,...k->...', to_look_at, to_look_at))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # cos alpha = A dot B / (norm A * norm B), nan when the target or the look at point is the observer's position
+        cos_angle = np.einsum('...nmk,...nk->...nm', to_target, to_look_at) / \
+            (range_to_target * range_to_look_at[..., np.newaxis])
+
+    # first quarter  - cos function decreasing
+    return (range_to_target < np.asarray(max_range)[..., np.newaxis]) & \
+        (cos_angle > np.cos(np.asarray(fov))[..., np.newaxis])
@@ -1,12 +1,12 @@
 import numpy as np
 # from geodesy import utm
-from pyproj import Proj
+from logic_simulator import projection
 
 class Pos:
     EPSILON_DISTANCE = 0.1
     old_school = False
-    ZoneNo = "36"
-    myProjPsik = Proj(proj= 'utm', zone=ZoneNo, ellps='WGS84', preserve_units=False) #Proj("+proj=utm +zone=" + ZoneNo + "+south +ellps=WGS84 +datum=WGS84 +units=m +no_defs")
+    ZoneNo = projection.ZONE_NO
+    myProjPsik = projection.UTM_PROJ #Proj("+proj=utm +zone=" + ZoneNo + "+south +ellps=WGS84 +datum=WGS84 +units=m +no_defs")
     def __init__(self, lat=0.0, lon=0.0, z=0.0):
         """
             x=LAT, y=LONG, z=ALT
@@ -26,6 +26,58 @@ class Pos:
         # my_point = my_utm.toPoint()
         self._z = float(z)
 
+    @classmethod
+    def from_xyz(cls, x, y, z):
+        """
+            Build a Pos from metric UTM coordinates, x=EASTING, y=NORTHING, z=ALT
+        """
+        pos = Pos.__new__(Pos)
+        pos._x = float(x)
+        pos._y = float(y)
+        pos._z = float(z)
+        # lat/lon are computed on first use
+        pos._lon = None
+        pos._lat = None
+        return pos
+
+    @classmethod
+    def from_lat_lon_alt(cls, points):
+        """
+            Build many positions from (lat, lon, alt) triplets with a single projection call
+        Returns:
+            list of Pos
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        xyz = projection.to_metric(points[:, 0], points[:, 1], points[:, 2])
+        positions = [Pos.from_xyz(*row) for row in xyz]
+        for p, (lat, lon, _) in zip(positions, points):
+            p._set_lat_lon(float(lat), float(lon))
+        return positions
+
+    @staticmethod
+    def update_lat_lon(positions):
+        """
+            Compute and cache lat/lon of many positions with a single inverse projection call
+        """
+        positions = [p for p in positions if p.is_lat_lon_stale()]
+        if len(positions) == 0:
+            return
+        lats, lons, _ = projection.to_geodetic([[p.x, p.y, p.z] for p in positions])
+        for p, lat, lon in zip(positions, lats, lons):
+            p._set_lat_lon(float(lat), float(lon))
+
+    def is_lat_lon_stale(self) -> bool:
+        return self._lat is None
+
+    def _set_lat_lon(self, lat, lon):
+        self._lat = lat
+        self._lon = lon
+
+    def _update_lat_lon(self):
+        if self.is_lat_lon_stale():
+            lon, lat = Pos.myProjPsik(self.x, self.y, inverse=True)
+            self._set_lat_lon(lat, lon)
+
     @property
     def x(self):
         return self._x
@@ -40,10 +92,12 @@ class Pos:
 
     @property
     def lat(self):
+        self._update_lat_lon()
         return self._lat
 
     @property
     def lon(self):
+        self._update_lat_lon()
         return self._lon
 
 
@@ -54,7 +108,9 @@ class Pos:
         self._x += vec[0]
         self._y += vec[1]
         self._z += vec[2]
-        self._lon, self._lat, _ = self.toLongLatAlt()
+        # lat/lon are recomputed lazily, moving stays in metric coordinates
+        self._lat = None
+        self._lon = None
 
     def distance_to(self, other) -> float:
         return np.linalg.norm(np.array([self.x, self.y, self.z]) - np.array([other.x, other.y, other.z]))
@@ -68,6 +124,4 @@ class Pos:
 
     def toLongLatAlt(self):
         # long, lat = Pos.myProjPsik(self._x, self._y, inverse=True)
-        long, lat = Pos.myProjPsik(self._x, self._y, inverse=True)
-        alt = self._z
-        return long, lat, alt
+        return self.lon, self.lat, self.z
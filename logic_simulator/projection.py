@@ -0,0 +1,33 @@
+import numpy as np
+from pyproj import Proj
+
+# Vectorized conversions between geodetic (lat, lon, alt) and the metric UTM frame positions live in.
+# Each function converts whole arrays with a single projection call.
+
+ZONE_NO = "36"
+UTM_PROJ = Proj(proj='utm', zone=ZONE_NO, ellps='WGS84', preserve_units=False)
+
+
+def to_metric(lat, lon, alt=0.0):
+    """
+    lat, lon, alt - arrays (or scalars) of geodetic coordinates
+    returns N x 3 array of x=EASTING, y=NORTHING, z=ALT
+    """
+    lat = np.atleast_1d(np.asarray(lat, dtype=float))
+    lon = np.atleast_1d(np.asarray(lon, dtype=float))
+    x, y = UTM_PROJ(lon, lat)
+    xyz = np.empty((len(lat), 3), dtype=float)
+    xyz[:, 0] = x
+    xyz[:, 1] = y
+    xyz[:, 2] = alt
+    return xyz
+
+
+def to_geodetic(xyz):
+    """
+    xyz - N x 3 array of metric coordinates
+    returns lat, lon, alt arrays
+    """
+    xyz = np.atleast_2d(np.asarray(xyz, dtype=float))
+    lon, lat = UTM_PROJ(xyz[:, 0], xyz[:, 1], inverse=True)
+    return np.asarray(lat), np.asarray(lon), xyz[:, 2].copy()
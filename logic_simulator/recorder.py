@@ -0,0 +1,205 @@
+import json
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+from logic_simulator.ugv import Ugv
+
+# Columnar recording of LogicSim episodes.
+# Every episode gets one row per recorded step (row 0 is the state after reset) in these columns,
+# E entities, M enemies, A = len(LogicSim.ACTIONS) in the sim's order:
+#   step                 T                    int64
+#   entities_pos         T x E x 3            float64 metric
+#   entities_velocity    T x E x 3            float64
+#   entities_looking_at  T x E x 3            float64 metric
+#   entities_health      T x E                float32
+#   enemies_pos          T x M x 3            float64 metric
+#   enemies_health       T x M                float32
+#   los                  T x E x M            bool
+#   actions              T x E x A x 4        float64 x, y, z, path index (sorted(Ugv.paths), -1 if not a path)
+#                                             of the actions issued in the step, nan where not issued
+# An episode is a directory of .npy files (memory mappable) with a meta.json,
+# or a single compressed .npz file holding the columns and the meta as a json string.
+
+META_FILE = 'meta.json'
+
+
+def _columns(num_entities, num_enemies, num_actions):
+    return {
+        'step': ((), np.int64),
+        'entities_pos': ((num_entities, 3), np.float64),
+        'entities_velocity': ((num_entities, 3), np.float64),
+        'entities_looking_at': ((num_entities, 3), np.float64),
+        'entities_health': ((num_entities,), np.float32),
+        'enemies_pos': ((num_enemies, 3), np.float64),
+        'enemies_health': ((num_enemies,), np.float32),
+        'los': ((num_entities, num_enemies), bool),
+        'actions': ((num_entities, num_actions, 4), np.float64),
+    }
+
+
+COLUMNS = tuple(_columns(0, 0, 0).keys())
+
+
+def episode_name(index):
+    return 'episode_{:06d}'.format(index)
+
+
+class EpisodeRecorder:
+    """
+    Records LogicSim episodes into preallocated columnar arrays, one file set per episode.
+    The arrays hold MAX_STEPS + 1 rows up front and double when an episode runs longer.
+    Attach it with sim.recorder = EpisodeRecorder(directory), or call begin_episode / record / end_episode.
+    compress - write each episode as one compressed .npz when it ends instead of .npy memory maps
+    flush_every - number of steps between flushes of the memory maps and meta.json to disk
+    """
+
+    def __init__(self, directory, compress=False, flush_every=50):
+        assert flush_every >= 1
+        self._directory = directory
+        self._compress = compress
+        self._flush_every = flush_every
+        self._episode = 0
+        self._columns = None
+        self._meta = None
+        self._length = 0
+        self._path = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def directory(self):
+        return self._directory
+
+    @property
+    def episodes(self):
+        """
+        number of episodes begun so far
+        """
+        return self._episode
+
+    @property
+    def is_recording(self):
+        return self._columns is not None
+
+    def begin_episode(self, sim, actions=None):
+        """
+        Start a new episode, its first row is the current state of sim
+        """
+        self.end_episode()
+        num_actions = len(sim.ACTIONS)
+        capacity = sim.MAX_STEPS + 1
+        name = episode_name(self._episode)
+        self._episode += 1
+        self._meta = {
+            'length': 0,
+            'entity_ids': [str(e.id) for e in sim.entities],
+            'enemy_ids': [str(e.id) for e in sim.enemies],
+            'actions': list(sim.ACTIONS),
+            'paths': [str(p) for p in sorted(Ugv.paths.keys())],
+        }
+        self._entity_index = {e.id: i for i, e in enumerate(sim.entities)}
+        self._action_index = {name: i for i, name in enumerate(sim.ACTIONS)}
+        self._path_index = {p: i for i, p in enumerate(sorted(Ugv.paths.keys()))}
+        self._no_action = sim.NO_ACTION
+
+        columns = _columns(len(self._meta['entity_ids']), len(self._meta['enemy_ids']), num_actions)
+        if self._compress:
+            self._path = os.path.join(self._directory, name + '.npz')
+            self._columns = {k: np.zeros((capacity,) + shape, dtype=dtype) for k, (shape, dtype) in columns.items()}
+        else:
+            self._path = os.path.join(self._directory, name)
+            os.makedirs(self._path, exist_ok=True)
+            self._columns = {k: open_memmap(os.path.join(self._path, k + '.npy'), mode='w+', dtype=dtype,
+                                            shape=(capacity,) + shape)
+                             for k, (shape, dtype) in columns.items()}
+        self._length = 0
+        self.record(sim, actions)
+
+    def record(self, sim, actions=None):
+        """
+        Append the current state of sim and the actions (dictionary or action array) of the step that led to it
+        """
+        if self._columns is None:
+            self.begin_episode(sim, actions)
+            return
+        row = self._length
+        if row == len(self._columns['step']):
+            self._grow()
+        columns = self._columns
+
+        world = sim.world
+        entity_slots, enemy_slots = sim.entity_slots, sim.enemy_slots
+        columns['step'][row] = sim.step_count
+        columns['entities_pos'][row] = world.pos[entity_slots]
+        columns['entities_velocity'][row] = world.speed[entity_slots, np.newaxis] * world.velocity_dir[entity_slots]
+        columns['entities_looking_at'][row] = world.looking_at[entity_slots]
+        columns['entities_health'][row] = world.health[entity_slots]
+        columns['enemies_pos'][row] = world.pos[enemy_slots]
+        columns['enemies_health'][row] = world.health[enemy_slots]
+        columns['los'][row] = sim.los_matrix
+        self._encode_actions(actions, columns['actions'][row])
+
+        self._length += 1
+        if not self._compress and self._length % self._flush_every == 0:
+            self._flush()
+
+    def _grow(self):
+        # twice the rows, memory maps are copied into new files that replace the old ones
+        capacity = 2 * len(self._columns['step'])
+        for k, old in self._columns.items():
+            if self._compress:
+                new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:self._length] = old[:self._length]
+            else:
+                path = os.path.join(self._path, k + '.npy')
+                new = open_memmap(path + '.grow', mode='w+', dtype=old.dtype, shape=(capacity,) + old.shape[1:])
+                new[:self._length] = old[:self._length]
+                new.flush()
+                os.replace(path + '.grow', path)
+            self._columns[k] = new
+
+    def _encode_actions(self, actions, out):
+        out[...] = np.nan
+        if actions is not None and not isinstance(actions, dict):
+            # action array rows, see LogicSim.actions_from_array
+            actions = np.asarray(actions, dtype=float)
+            codes = np.asarray(actions[:, 0], dtype=int)
+            rows = np.flatnonzero(codes != self._no_action)
+            out[rows, codes[rows], :3] = actions[rows, 1:4]
+            out[rows, codes[rows], 3] = np.where(codes[rows] == self._action_index['TAKE_PATH'], actions[rows, 4], -1)
+            return
+        for action_name, ent_params_list in (actions or {}).items():
+            a = self._action_index[action_name]
+            for ent_params in ent_params_list:
+                for entity_id, params in ent_params.items():
+                    if action_name == 'TAKE_PATH':
+                        path_index, pos = self._path_index[params[0]], params[1]
+                    else:
+                        path_index, pos = -1, params[0]
+                    out[self._entity_index[entity_id], a] = (pos.x, pos.y, pos.z, path_index)
+
+    def _flush(self):
+        for column in self._columns.values():
+            column.flush()
+        self._meta['length'] = self._length
+        with open(os.path.join(self._path, META_FILE), 'w') as f:
+            json.dump(self._meta, f)
+
+    def end_episode(self):
+        """
+        Write the episode being recorded, returns its path or None if there is none
+        """
+        if self._columns is None:
+            return None
+        if self._compress:
+            self._meta['length'] = self._length
+            np.savez_compressed(self._path, meta=json.dumps(self._meta),
+                                **{k: v[:self._length] for k, v in self._columns.items()})
+        else:
+            self._flush()
+        path = self._path
+        self._columns = None
+        self._path = None
+        return path
+
+    def close(self):
+        self.end_episode()
@@ -0,0 +1,139 @@
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 registers the 3d projection
+from itertools import chain
+from logic_simulator.ugv import Ugv
+from logic_simulator.suicide_drone import SuicideDrone
+from logic_simulator.enemy import Enemy
+
+
+class FrameSink:
+    """
+    Writes rendered frames to a file.
+    .npz files get all frames as one (num_frames x height x width x 3) uint8 array on close,
+    other extensions (.mp4, .gif ...) are streamed to a video with imageio
+    """
+
+    def __init__(self, path, fps=10):
+        self._path = path
+        self._frames = []
+        self._writer = None
+        if not path.endswith('.npz'):
+            try:
+                import imageio
+            except ImportError:
+                raise ImportError('writing {} needs imageio, use a .npz path instead'.format(path))
+            self._writer = imageio.get_writer(path, fps=fps)
+
+    @property
+    def path(self):
+        return self._path
+
+    def write(self, frame):
+        if self._writer is not None:
+            self._writer.append_data(frame)
+        else:
+            self._frames.append(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif len(self._frames) > 0:
+            np.savez_compressed(self._path, frames=np.stack(self._frames))
+            self._frames = []
+
+
+class Renderer:
+    """
+    3D scatter of a LogicSim's entities and enemies.
+    The artists are created once and only their positions are updated on every render.
+    headless - draw on an offscreen Agg canvas, for rgb_array frames without a display
+    every - draw only every Nth call to render, the others return None
+    sink - optional FrameSink every drawn frame is written to
+    """
+    XLIM = (-100.0, 200.0)
+    YLIM = (-400.0, 100.0)
+    ZLIM = (-1.0, 30.0)
+
+    def __init__(self, sim, headless=False, every=1, sink=None, pause=0.001,
+                 xlim=XLIM, ylim=YLIM, zlim=ZLIM):
+        assert every >= 1
+        self._sim = sim
+        self._headless = headless
+        self._every = every
+        self._sink = sink
+        self._pause = pause
+        self._calls = 0
+        if headless:
+            self._fig = Figure()
+            FigureCanvasAgg(self._fig)
+        else:
+            import matplotlib.pyplot as plt
+            matplotlib.interactive(True)
+            self._fig = plt.figure()
+        self._ax = self._fig.add_subplot(111, projection='3d')
+        self._ax.set_xlabel('X')
+        self._ax.set_ylabel('Y')
+        self._ax.set_zlabel('Z')
+        self._ax.set_xlim(*xlim)
+        self._ax.set_ylim(*ylim)
+        self._ax.set_zlim(*zlim)
+        self._scatter = None
+
+    @property
+    def figure(self):
+        return self._fig
+
+    @property
+    def sink(self):
+        return self._sink
+
+    @staticmethod
+    def _color(e):
+        return 'r' if isinstance(e, Enemy) else 'm' if isinstance(e, Ugv) else 'g' if isinstance(e, SuicideDrone) \
+            else 'b'
+
+    def _positions(self):
+        world = self._sim.world
+        slots = [e._slot for e in chain(self._sim.entities, self._sim.enemies)]
+        return world.pos[slots]
+
+    def render(self, mode='human'):
+        """
+        returns the frame as a height x width x 3 uint8 array in 'rgb_array' mode
+        or when writing to a sink, otherwise None
+        """
+        self._calls += 1
+        if (self._calls - 1) % self._every != 0:
+            return None
+
+        positions = self._positions()
+        if self._scatter is None:
+            colors = [Renderer._color(e) for e in chain(self._sim.entities, self._sim.enemies)]
+            self._scatter = self._ax.scatter(positions[:, 0], positions[:, 1], positions[:, 2], c=colors, marker='o')
+        else:
+            self._scatter._offsets3d = (positions[:, 0], positions[:, 1], positions[:, 2])
+            # plt.pause only redraws stale figures
+            self._scatter.stale = True
+
+        if mode == 'human' and not self._headless:
+            import matplotlib.pyplot as plt
+            plt.pause(self._pause)
+        if mode != 'rgb_array' and self._sink is None:
+            return None
+
+        self._fig.canvas.draw()
+        frame = np.asarray(self._fig.canvas.buffer_rgba())[..., :3].copy()
+        if self._sink is not None:
+            self._sink.write(frame)
+        return frame if mode == 'rgb_array' else None
+
+    def close(self):
+        if self._sink is not None:
+            self._sink.close()
+        if not self._headless:
+            import matplotlib.pyplot as plt
+            plt.close(self._fig)
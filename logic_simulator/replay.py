@@ -0,0 +1,223 @@
+import json
+import os
+import numpy as np
+from logic_simulator.recorder import META_FILE, COLUMNS
+
+# Reading episodes written by logic_simulator.recorder.EpisodeRecorder and analytics over many of them.
+# The analytics work on columns stacked across episodes (see EpisodeStore.stack), padded past each episode's length.
+# EpisodeStore.consolidate writes the stacked columns of a directory once, one .npy per column in STACKED_DIR,
+# so later stores memory map them instead of opening every episode.
+
+STACKED_DIR = 'stacked'
+
+
+class Episode:
+    """
+    One recorded episode. Columns of .npy episodes are memory mapped and indexing returns views of the
+    recorded rows without reading or copying the data, .npz episodes are decompressed on first access.
+    """
+
+    def __init__(self, path):
+        self._path = path
+        if path.endswith('.npz'):
+            self._npz = np.load(path)
+            self._meta = json.loads(str(self._npz['meta']))
+        else:
+            self._npz = None
+            with open(os.path.join(path, META_FILE)) as f:
+                self._meta = json.load(f)
+        self._columns = {}
+
+    @property
+    def path(self):
+        return self._path
+
+    @property
+    def meta(self):
+        return self._meta
+
+    @property
+    def entity_ids(self):
+        return self._meta['entity_ids']
+
+    @property
+    def enemy_ids(self):
+        return self._meta['enemy_ids']
+
+    def __len__(self):
+        return self._meta['length']
+
+    def __getitem__(self, column):
+        """
+        column - a column name of logic_simulator.recorder, returns its recorded rows
+        """
+        if column not in self._columns:
+            if self._npz is not None:
+                data = self._npz[column]
+            else:
+                data = np.load(os.path.join(self._path, column + '.npy'), mmap_mode='r')
+            self._columns[column] = data[:len(self)]
+        return self._columns[column]
+
+    def close(self):
+        self._columns = {}
+        if self._npz is not None:
+            self._npz.close()
+
+
+class EpisodeStore:
+    """
+    All episodes recorded in a directory, in recording order.
+    Stacked columns are cached, they come from the consolidated files when those cover all the episodes
+    """
+
+    def __init__(self, directory):
+        self._directory = directory
+        names = sorted(n for n in os.listdir(directory) if n.startswith('episode_'))
+        self._paths = [os.path.join(directory, n) for n in names]
+        self._episodes = {}
+        self._stacked = {}
+        self._lengths = None
+        self._consolidated = False
+        lengths_path = os.path.join(directory, STACKED_DIR, 'lengths.npy')
+        if os.path.exists(lengths_path):
+            lengths = np.load(lengths_path)
+            # episodes recorded after consolidate are not in the files, stack them one by one again
+            if len(lengths) == len(self._paths):
+                self._lengths = lengths
+                self._consolidated = True
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, i) -> Episode:
+        if i not in self._episodes:
+            self._episodes[i] = Episode(self._paths[i])
+        return self._episodes[i]
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def lengths(self):
+        if self._lengths is None:
+            self._lengths = np.array([len(e) for e in self], dtype=int)
+        return self._lengths
+
+    def stack(self, column, fill=0):
+        """
+        column of every episode as one N x T x ... array, T the longest episode, shorter ones padded with fill.
+        The array is cached, do not write to it
+        """
+        if len(self) == 0:
+            raise ValueError('no episodes in {}'.format(self._directory))
+        key = (column, fill)
+        if key not in self._stacked:
+            if self._consolidated:
+                out = np.load(os.path.join(self._directory, STACKED_DIR, column + '.npy'), mmap_mode='r')
+                if fill != 0:
+                    out = np.array(out)
+                    out[~self.valid()] = fill
+            else:
+                out = self._stack_episodes(column, fill)
+            self._stacked[key] = out
+        return self._stacked[key]
+
+    def _stack_episodes(self, column, fill):
+        lengths = self.lengths
+        first = self[0][column]
+        out = np.full((len(self), lengths.max()) + first.shape[1:], fill, dtype=first.dtype)
+        for i, episode in enumerate(self):
+            out[i, :lengths[i]] = episode[column]
+        return out
+
+    def valid(self):
+        """
+        N x T mask of the rows recorded in each episode, matching stack()
+        """
+        lengths = self.lengths
+        if len(lengths) == 0:
+            return np.zeros((0, 0), dtype=bool)
+        return np.arange(lengths.max())[np.newaxis] < lengths[:, np.newaxis]
+
+    def consolidate(self):
+        """
+        Write every column stacked over the episodes (padded with 0) and the episode lengths to STACKED_DIR,
+        stores opened on the directory afterwards read those instead of the episodes
+        """
+        if len(self) == 0:
+            raise ValueError('no episodes in {}'.format(self._directory))
+        path = os.path.join(self._directory, STACKED_DIR)
+        os.makedirs(path, exist_ok=True)
+        for column in COLUMNS:
+            np.save(os.path.join(path, column + '.npy'), self.stack(column))
+        # written last, it marks the columns complete
+        np.save(os.path.join(path, 'lengths.npy'), self.lengths)
+
+    def close(self):
+        for episode in self._episodes.values():
+            episode.close()
+        self._episodes = {}
+        self._stacked = {}
+
+
+def time_to_first_los(store: EpisodeStore):
+    """
+    step of the first row any entity had line of sight to any enemy, -1 where it never happened
+    returns N array
+    """
+    any_los = store.stack('los', fill=False).any(axis=(2, 3))
+    first = np.argmax(any_los, axis=1)
+    steps = store.stack('step')[np.arange(len(first)), first]
+    return np.where(any_los.any(axis=1), steps, -1)
+
+
+def distance_traveled(store: EpisodeStore):
+    """
+    meters each entity moved along its trajectory
+    returns N x E array
+    """
+    pos = store.stack('entities_pos')
+    both_valid = store.valid()[:, 1:]
+    segments = np.linalg.norm(np.diff(pos, axis=1), axis=3)
+    return (segments * both_valid[..., np.newaxis]).sum(axis=1)
+
+
+def time_positioned(store: EpisodeStore, positions, radius=6.0):
+    """
+    ticks each entity spent closer than radius to its position
+    positions - E x 3 metric position per entity, in the episodes entities order
+    returns N x E array
+    """
+    pos = store.stack('entities_pos')
+    positioned = np.linalg.norm(pos - np.asarray(positions, dtype=float), axis=3) < radius
+    # a row stands for the ticks until the next recorded row, step_to_event rows span many
+    steps = store.stack('step')
+    ticks = np.diff(steps, axis=1) * store.valid()[:, 1:]
+    return (positioned[:, :-1] * ticks[..., np.newaxis]).sum(axis=1)
+
+
+def attack_outcomes(store: EpisodeStore):
+    """
+    returns dictionary of N arrays:
+        'enemies_killed' - enemies with no health left at the end of the episode
+        'entities_lost' - entities with no health left at the end of the episode
+        'first_kill_step' - step the first enemy was killed at, -1 if none was
+        'attacks' - ATTACK actions issued
+    """
+    last = store.lengths - 1
+    episodes = np.arange(len(store))
+    enemies_health = store.stack('enemies_health', fill=1.0)
+    entities_health = store.stack('entities_health', fill=1.0)
+    any_killed = (enemies_health <= 0.0).any(axis=2)
+    first_kill = np.argmax(any_killed, axis=1)
+    steps = store.stack('step')
+
+    attack = store[0].meta['actions'].index('ATTACK')
+    attacks = np.isfinite(store.stack('actions', fill=np.nan)[:, :, :, attack, 0]).sum(axis=(1, 2))
+    return {
+        'enemies_killed': (enemies_health[episodes, last] <= 0.0).sum(axis=1),
+        'entities_lost': (entities_health[episodes, last] <= 0.0).sum(axis=1),
+        'first_kill_step': np.where(any_killed.any(axis=1), steps[episodes, first_kill], -1),
+        'attacks': attacks,
+    }
@@ -0,0 +1,147 @@
+import random
+import multiprocessing
+from collections import namedtuple
+from functools import partial
+import numpy as np
+
+# Runs many LogicSim episodes on a process pool.
+# Every worker builds its simulator once with make_sim and reuses it (reset) for all the episodes it gets,
+# episode i is seeded with seed + i whatever worker runs it (LogicSim.seed, random and np.random),
+# so a farm run is reproducible.
+# make_sim and run_episode are sent to the workers, they must be picklable (module level functions).
+
+EpisodeResult = namedtuple('EpisodeResult', ['episode', 'reward', 'steps', 'dead', 'lost'])
+
+_worker_sim = None
+_worker_run_episode = None
+
+
+def _init_worker(make_sim, run_episode):
+    global _worker_sim, _worker_run_episode
+    _worker_sim = make_sim()
+    _worker_run_episode = run_episode
+
+
+def _run_seeded(episode, seed, run_episode):
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+    _worker_sim.seed(seed)
+    _worker_sim.reset()
+    reward, steps, dead, lost = run_episode(_worker_sim)
+    return EpisodeResult(episode, reward, steps, dead, lost)
+
+
+def _run_one(args):
+    episode, seed = args
+    return _run_seeded(episode, seed, _worker_run_episode)
+
+
+def _run_config(args):
+    # run_episode takes the configuration first, see ScenarioFarm.imap_configs
+    key, config, episode, seed = args
+    return key, _run_seeded(episode, seed, partial(_worker_run_episode, config))
+
+
+class FarmStats:
+    """
+    Aggregated results of the episodes finished so far
+    """
+    FIELDS = ('reward', 'steps', 'dead', 'lost')
+
+    def __init__(self):
+        self._results = []
+
+    def add(self, result: EpisodeResult):
+        self._results.append(result)
+
+    def __len__(self):
+        return len(self._results)
+
+    @property
+    def results(self):
+        """
+        results by episode number
+        """
+        return sorted(self._results, key=lambda r: r.episode)
+
+    def summary(self):
+        """
+        returns dictionary of field to dictionary of mean, std, min, max
+        """
+        if len(self._results) == 0:
+            return {}
+        values = np.array([[getattr(r, f) for f in FarmStats.FIELDS] for r in self._results], dtype=float)
+        return {f: {'mean': values[:, i].mean(), 'std': values[:, i].std(),
+                    'min': values[:, i].min(), 'max': values[:, i].max()}
+                for i, f in enumerate(FarmStats.FIELDS)}
+
+    def __str__(self):
+        s = 'episodes {}'.format(len(self))
+        for f, stats in self.summary().items():
+            s += '\n{} mean {:.4f} std {:.4f} min {:.4f} max {:.4f}'.format(f, stats['mean'], stats['std'],
+                                                                             stats['min'], stats['max'])
+        return s
+
+
+class ScenarioFarm:
+    """
+    make_sim - builds the LogicSim of a worker
+    run_episode - plays one episode on a reset LogicSim, returns reward, steps, dead, lost
+    num_workers - pool size, defaults to the number of cores. 0 runs the episodes in this process
+    seed - seed of episode 0
+    """
+
+    def __init__(self, make_sim, run_episode, num_workers=None, seed=0, chunksize=1):
+        self._make_sim = make_sim
+        self._run_episode = run_episode
+        self._num_workers = multiprocessing.cpu_count() if num_workers is None else num_workers
+        self._seed = seed
+        self._chunksize = chunksize
+
+    @property
+    def num_workers(self):
+        return self._num_workers
+
+    def imap(self, num_episodes, first_episode=0):
+        """
+        Yields an EpisodeResult as soon as each episode finishes, not in episode order
+        """
+        tasks = [(i, self._seed + i) for i in range(first_episode, first_episode + num_episodes)]
+        if self._num_workers == 0:
+            _init_worker(self._make_sim, self._run_episode)
+            for task in tasks:
+                yield _run_one(task)
+            return
+        with multiprocessing.Pool(self._num_workers, initializer=_init_worker,
+                                  initargs=(self._make_sim, self._run_episode)) as pool:
+            for result in pool.imap_unordered(_run_one, tasks, chunksize=self._chunksize):
+                yield result
+
+    def imap_configs(self, configs, num_episodes):
+        """
+        Episodes 0 .. num_episodes - 1 of every configuration, all on one pool, with run_episode(config, sim)
+        configs - dictionary of key to configuration
+        Yields (key, EpisodeResult) as soon as each episode finishes
+        """
+        tasks = [(key, config, i, self._seed + i) for key, config in configs.items() for i in range(num_episodes)]
+        if self._num_workers == 0:
+            _init_worker(self._make_sim, self._run_episode)
+            for task in tasks:
+                yield _run_config(task)
+            return
+        with multiprocessing.Pool(self._num_workers, initializer=_init_worker,
+                                  initargs=(self._make_sim, self._run_episode)) as pool:
+            for result in pool.imap_unordered(_run_config, tasks, chunksize=self._chunksize):
+                yield result
+
+    def run(self, num_episodes, callback=None, first_episode=0) -> FarmStats:
+        """
+        Run num_episodes episodes
+        callback - optional, called with every EpisodeResult as it arrives
+        """
+        stats = FarmStats()
+        for result in self.imap(num_episodes, first_episode):
+            stats.add(result)
+            if callback is not None:
+                callback(result)
+        return stats
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class UniformGrid:
+    """
+    Uniform grid over the x, y plane of a set of metric positions.
+    Points are kept sorted by cell key, so rebuilding is a single argsort and a query of many
+    centers at once costs a few searchsorted calls per neighbouring cell offset.
+    """
+
+    def __init__(self, cell_size):
+        assert cell_size > 0
+        self._cell_size = float(cell_size)
+        self._points = np.zeros((0, 3), dtype=float)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._order = np.zeros(0, dtype=int)
+
+    @property
+    def cell_size(self):
+        return self._cell_size
+
+    def __len__(self):
+        return len(self._points)
+
+    def _cells(self, points):
+        return np.floor(points[:, :2] / self._cell_size).astype(np.int64)
+
+    @staticmethod
+    def _key(cell_x, cell_y):
+        # unique as long as |cell_y| < 2 ** 31, far beyond any UTM coordinate
+        return (cell_x << 32) + cell_y
+
+    def rebuild(self, points):
+        """
+        points - N x 3 metric positions, indices of queries results refer to this order
+        """
+        self._points = np.array(points, dtype=float).reshape(-1, 3)
+        cells = self._cells(self._points)
+        keys = UniformGrid._key(cells[:, 0], cells[:, 1])
+        self._order = np.argsort(keys, kind='stable')
+        self._keys = keys[self._order]
+
+    def query_pairs(self, centers, radii):
+        """
+        All (center, point) pairs closer than the center's radius
+        centers - M x 3 metric positions
+        radii - scalar or M radii
+        returns center indices and point indices arrays
+        """
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (len(centers),))
+        if len(centers) == 0 or len(self._points) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+
+        span = int(np.ceil(radii.max() / self._cell_size))
+        cells = self._cells(centers)
+        center_indices, point_indices = [], []
+        for dx in range(-span, span + 1):
+            for dy in range(-span, span + 1):
+                keys = UniformGrid._key(cells[:, 0] + dx, cells[:, 1] + dy)
+                first = np.searchsorted(self._keys, keys, side='left')
+                counts = np.searchsorted(self._keys, keys, side='right') - first
+                total = counts.sum()
+                if total == 0:
+                    continue
+                # expand every [first, first + count) range of sorted positions
+                run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+                sorted_positions = np.arange(total) - run_starts + np.repeat(first, counts)
+                center_indices.append(np.repeat(np.arange(len(centers)), counts))
+                point_indices.append(self._order[sorted_positions])
+
+        if len(center_indices) == 0:
+            return np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+        center_indices = np.concatenate(center_indices)
+        point_indices = np.concatenate(point_indices)
+        distances = np.linalg.norm(self._points[point_indices] - centers[center_indices], axis=1)
+        close = distances < radii[center_indices]
+        return center_indices[close], point_indices[close]
+
+    def query_radius(self, center, radius):
+        """
+        Sorted indices of the points closer than radius to center
+        """
+        _, point_indices = self.query_pairs([center], radius)
+        return np.sort(point_indices)
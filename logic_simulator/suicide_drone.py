@@ -11,6 +11,8 @@ class SuicideDrone(Drone):
         super().__init__(id, pos)
         self._fov = SuicideDrone.FIELD_OF_VIEW
         self._attacking = False
+        self._attack_pos = None
+        self._enemies_in_danger = None
 
     def update(self):
         if self._attacking:
@@ -19,7 +21,7 @@ class SuicideDrone(Drone):
             super().update()
 
     def attack(self, pos, enemies_in_danger):
-        logging.info("SuicideDrone Attack on {} {} {}".format(pos.X, pos.Y, pos.Z))
+        logging.info("SuicideDrone Attack on %s %s %s", pos.x, pos.y, pos.z)
         self._attacking = True
         self._attack_pos = pos
         self._enemies_in_danger = enemies_in_danger
@@ -32,3 +34,42 @@ class SuicideDrone(Drone):
             for e in enemies_in_danger:
                 e.health = 0.0
             self.health = 0.0
+
+    def _is_attack_pending(self) -> bool:
+        # update() keeps going to the attack position
+        return self._target_pos.equals(self._attack_pos) and \
+            self._attack_pos.distance_to(self.pos) > SuicideDrone.EPSILON
+
+    def _is_idle(self) -> bool:
+        if not self._attacking:
+            return super()._is_idle()
+        return self._is_attack_pending() and super()._is_idle()
+
+    def _transit_guards(self):
+        if not self._attacking:
+            return super()._transit_guards()
+        guards = super()._transit_guards() if self._is_attack_pending() else None
+        return None if guards is None else guards + [(self._attack_pos, SuicideDrone.EPSILON)]
+
+    def _extra_state_size(self, num_enemies) -> int:
+        # attacking, attack x, y, z, in danger flag per enemy
+        return super()._extra_state_size(num_enemies) + 4 + num_enemies
+
+    def _save_extra_state(self, out, enemies):
+        out = super()._save_extra_state(out, enemies)
+        out[0] = self._attacking
+        out[1:4] = (self._attack_pos.x, self._attack_pos.y, self._attack_pos.z) if self._attacking else 0.0
+        in_danger = self._enemies_in_danger if self._attacking else []
+        out[4:4 + len(enemies)] = [any(e is d for d in in_danger) for e in enemies]
+        return out[4 + len(enemies):]
+
+    def _restore_extra_state(self, buf, enemies):
+        buf = super()._restore_extra_state(buf, enemies)
+        self._attacking = bool(buf[0])
+        if self._attacking:
+            self._attack_pos = Pos.from_xyz(*buf[1:4])
+            self._enemies_in_danger = [e for e, in_danger in zip(enemies, buf[4:4 + len(enemies)]) if in_danger]
+        else:
+            self._attack_pos = None
+            self._enemies_in_danger = None
+        return buf[4 + len(enemies):]
@@ -0,0 +1,158 @@
+import hashlib
+import itertools
+import json
+import os
+import random
+from logic_simulator.pos import Pos
+from logic_simulator.scenario_farm import ScenarioFarm, FarmStats
+
+# Parameter sweeps over scenario configurations.
+# A configuration is a dictionary of parameter name to value, a search space maps every name to
+# a list of candidate values or, for random search, a (low, high) range.
+# Each configuration is evaluated over the same seeded episodes and its summary is cached by configuration hash,
+# so re-running a sweep only evaluates new configurations. The episodes of all the new configurations of a run
+# share one ScenarioFarm pool, whose workers build their simulator once.
+# The hash does not cover the scenario code, start a new cache file after changing it.
+
+
+def _canonical(value):
+    # json friendly form of a parameter value, positions by their metric coordinates
+    if isinstance(value, Pos):
+        return [round(value.x, 6), round(value.y, 6), round(value.z, 6)]
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, float):
+        return round(value, 9)
+    return value
+
+
+def config_hash(config, episodes=None, seed=None):
+    """
+    Stable hash of a configuration, and of the episodes it was evaluated over if given
+    """
+    key = json.dumps({'config': _canonical(config), 'episodes': episodes, 'seed': seed}, sort_keys=True)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def grid(space):
+    """
+    Yields every combination of the candidate values of space
+    """
+    names = sorted(space.keys())
+    for values in itertools.product(*(space[n] for n in names)):
+        yield dict(zip(names, values))
+
+
+def random_search(space, num_samples, seed=0):
+    """
+    Yields num_samples configurations, each value drawn from its candidates list or (low, high) range
+    """
+    rng = random.Random(seed)
+    names = sorted(space.keys())
+    for _ in range(num_samples):
+        config = {}
+        for n in names:
+            candidates = space[n]
+            if isinstance(candidates, tuple):
+                low, high = candidates
+                config[n] = rng.randint(low, high) if isinstance(low, int) and isinstance(high, int) \
+                    else rng.uniform(low, high)
+            else:
+                config[n] = rng.choice(candidates)
+        yield config
+
+
+class SweepCache:
+    """
+    Summaries of evaluated configurations, one json line per configuration appended to path
+    """
+
+    def __init__(self, path):
+        self._path = path
+        self._entries = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry['hash']] = entry
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        return self._entries[key]['summary']
+
+    def put(self, key, config, summary):
+        entry = {'hash': key, 'config': _canonical(config), 'summary': summary}
+        self._entries[key] = entry
+        if self._path is not None:
+            with open(self._path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+
+
+class Sweep:
+    """
+    make_sim - builds the LogicSim of a farm worker
+    run_episode - run_episode(config, sim) plays one episode of a configuration, see ScenarioFarm
+    episodes - number of seeded episodes per configuration, the same seeds for all configurations
+    cache_path - json lines file of evaluated configurations, None keeps them in memory only
+    """
+
+    def __init__(self, make_sim, run_episode, episodes=100, num_workers=None, seed=0, cache_path=None):
+        self._make_sim = make_sim
+        self._run_episode = run_episode
+        self._episodes = episodes
+        self._num_workers = num_workers
+        self._seed = seed
+        self._cache = SweepCache(cache_path)
+
+    @property
+    def cache(self):
+        return self._cache
+
+    def evaluate(self, config):
+        """
+        returns FarmStats summary of the configuration, from the cache when it was evaluated before
+        """
+        return self.run([config])[0][1]
+
+    def run(self, configs, callback=None):
+        """
+        Evaluate every configuration, the episodes of those not in the cache together on one pool
+        callback - optional, called with every configuration and its summary, cached ones first and
+                the others as their last episode finishes
+        returns list of (config, summary) in configs order
+        """
+        configs = list(configs)
+        keys = [config_hash(config, self._episodes, self._seed) for config in configs]
+        new = {}
+        for key, config in zip(keys, configs):
+            if key in self._cache:
+                if callback is not None:
+                    callback(config, self._cache.get(key))
+            else:
+                new[key] = config
+        if new:
+            stats = {key: FarmStats() for key in new}
+            farm = ScenarioFarm(self._make_sim, self._run_episode, num_workers=self._num_workers, seed=self._seed)
+            for key, result in farm.imap_configs(new, self._episodes):
+                stats[key].add(result)
+                if len(stats[key]) == self._episodes:
+                    self._cache.put(key, new[key], stats[key].summary())
+                    if callback is not None:
+                        callback(new[key], self._cache.get(key))
+        return [(config, self._cache.get(key)) for key, config in zip(keys, configs)]
+
+    @staticmethod
+    def best(results, field='reward', stat='mean', maximize=True):
+        """
+        (config, summary) of results with the best field statistic
+        """
+        key = (lambda r: r[1][field][stat])
+        return max(results, key=key) if maximize else min(results, key=key)
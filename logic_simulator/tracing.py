@@ -0,0 +1,106 @@
+import numpy as np
+
+# Structured tracing of the entities kinematics.
+# Disabled by default: the hot path only checks `tracing.tracer is not None`, nothing is formatted.
+# enable() installs a KinematicsTracer recording into a preallocated ring buffer, dump() writes it to disk.
+
+CHANGE_TARGET = 0
+HOVER_IN_PLACE = 1
+CONTINUE_TO_TARGET = 2
+EVENT_NAMES = ('change_target', 'hover_in_place', 'continue_to_target')
+
+TRACE_DTYPE = np.dtype([
+    ('step', np.int64),
+    ('event', np.int8),
+    ('entity', np.int32),  # index into KinematicsTracer.entity_ids
+    ('pos', np.float64, (3,)),
+    ('velocity', np.float64, (3,)),
+    ('target', np.float64, (3,)),
+])
+
+tracer = None
+
+
+class KinematicsTracer:
+    """
+    Ring buffer of the last capacity kinematic events
+    """
+
+    def __init__(self, capacity=100000):
+        assert capacity > 0
+        self._records = np.zeros(capacity, dtype=TRACE_DTYPE)
+        self._count = 0
+        # entities are told apart by object, ids repeat across the episodes of a VecLogicSim
+        self._entity_index = {}
+        self._entity_ids = []
+        # set by LogicSim at the beginning of every step
+        self.step = 0
+
+    @property
+    def capacity(self):
+        return len(self._records)
+
+    @property
+    def entity_ids(self):
+        return list(self._entity_ids)
+
+    def __len__(self):
+        return min(self._count, self.capacity)
+
+    def record(self, event, entity):
+        """
+        event - one of the event codes of this module
+        entity - Entity whose state after the event is recorded
+        """
+        index = self._entity_index.get(id(entity))
+        if index is None:
+            index = self._entity_index[id(entity)] = len(self._entity_ids)
+            self._entity_ids.append(entity.id)
+        world, slot = entity._world, entity._slot
+        row = self._records[self._count % self.capacity]
+        row['step'] = self.step
+        row['event'] = event
+        row['entity'] = index
+        row['pos'] = world.pos[slot]
+        row['velocity'] = world.speed[slot] * world.velocity_dir[slot]
+        row['target'] = world.target[slot]
+        self._count += 1
+
+    def records(self):
+        """
+        Recorded events, oldest first
+        """
+        if self._count <= self.capacity:
+            return self._records[:self._count].copy()
+        start = self._count % self.capacity
+        return np.concatenate([self._records[start:], self._records[:start]])
+
+    def clear(self):
+        self._count = 0
+
+    def dump(self, path):
+        """
+        Save the recorded events, entity ids and event names to a .npz file
+        """
+        np.savez(path, records=self.records(), entity_ids=np.array(self.entity_ids, dtype=str),
+                 event_names=np.array(EVENT_NAMES))
+
+
+def enable(capacity=100000) -> KinematicsTracer:
+    global tracer
+    tracer = KinematicsTracer(capacity)
+    return tracer
+
+
+def disable():
+    global tracer
+    tracer = None
+
+
+def load(path):
+    """
+    Read a file written by KinematicsTracer.dump
+    returns records, entity_ids, event_names
+    """
+    with np.load(path) as f:
+        return f['records'], list(f['entity_ids']), list(f['event_names'])
@@ -1,7 +1,7 @@
 from logic_simulator.entity import Entity
 from logic_simulator.pos import Pos
+from logic_simulator.ugv_path import UgvPath
 import numpy as np
-import copy
 import logging
 
 
@@ -14,6 +14,8 @@ class Ugv(Entity):
     FIELD_OF_VIEW = 0.1745  # radians.   approx. 10 deg
 
     paths = {}
+    # path id to UgvPath compiled from the paths entry, see compiled_path
+    _compiled_paths = {}
 
     def __init__(self, id, pos: Pos):
         super().__init__(id, pos)
@@ -29,6 +31,18 @@ class Ugv(Entity):
         self._current_path_wp_index = 0
         self._final_wp = None
 
+    @staticmethod
+    def compiled_path(path_id) -> UgvPath:
+        """
+        UgvPath of Ugv.paths[path_id], compiled again only when the entry is replaced
+        """
+        assert path_id in Ugv.paths.keys()
+        waypoints = Ugv.paths[path_id]
+        path = Ugv._compiled_paths.get(path_id)
+        if path is None or path.waypoints is not waypoints or len(path) != len(waypoints):
+            path = Ugv._compiled_paths[path_id] = UgvPath(waypoints)
+        return path
+
     @property
     def pos(self) -> Pos:
         return self._pos
@@ -38,11 +52,11 @@ class Ugv(Entity):
         return self._speed * self._velocity_dir
 
     def look_at(self, pos):
-        logging.info('Ugv look_at ({},{},{})'.format(pos.X, pos.Y, pos.Z))
-        self._looking_at = copy.copy(pos)
+        logging.info('Ugv look_at (%s,%s,%s)', pos.x, pos.y, pos.z)
+        self._looking_at = pos
 
     def go_to(self, path_id, target_wp):
-        logging.debug('Ugv go_to path_id{} ({},{},{})'.format(path_id, target_wp.x, target_wp.y, target_wp.z))
+        logging.debug('Ugv go_to path_id%s (%s,%s,%s)', path_id, target_wp.x, target_wp.y, target_wp.z)
         self._final_wp = target_wp
         if self._reached_target(target_wp):
             logging.debug('Ugv go_to command satisfied')
@@ -52,33 +66,29 @@ class Ugv(Entity):
         else:
             # adjust path
             if path_id != self._current_path:
-                logging.debug('Ugv go_to change path from {} to {}'.format(self._current_path, path_id))
+                logging.debug('Ugv go_to change path from %s to %s', self._current_path, path_id)
                 self._current_path = path_id
                 self._current_path_wp_index = 0
-            assert path_id in Ugv.paths.keys()
-            waypoints = Ugv.paths[path_id]
-            num_of_waypoints = len(waypoints)
-            assert isinstance(waypoints, list) and num_of_waypoints > 0
+            path = Ugv.compiled_path(path_id)
+            num_of_waypoints = len(path)
             # next waypoint in current path
-            target_pos = waypoints[self._current_path_wp_index]
-            if not self._target_pos.equals(target_pos):
+            if not path.is_at_waypoint(self._world.target[self._slot], self._current_path_wp_index):
                 # commanded target has changed
-                self._change_target(target_pos)
+                self._change_target(path.waypoints[self._current_path_wp_index])
             elif self._reached_target():
                 if self._current_path_wp_index == (num_of_waypoints - 1):
                     # last waypoint in path
                     self._hover_in_place()
                 else:
-                    logging.debug('Ugv go_to waypoint index {} achieved'.format(self._current_path_wp_index))
+                    logging.debug('Ugv go_to waypoint index %s achieved', self._current_path_wp_index)
                     self._current_path_wp_index += 1
-                    target_pos = waypoints[self._current_path_wp_index]
-                    self._change_target(target_pos)
+                    self._change_target(path.waypoints[self._current_path_wp_index])
             else:
-                logging.debug('Ugv go_to continue to index {}'.format(self._current_path_wp_index))
+                logging.debug('Ugv go_to continue to index %s', self._current_path_wp_index)
                 self._continue_to_current_target()
 
     def attack(self, pos, enemies_in_danger):
-        logging.debug('Ugv Attack on {} {} {}'.format(pos.x, pos.y, pos.z))
+        logging.debug('Ugv Attack on %s %s %s', pos.x, pos.y, pos.z)
         # TODO logic for uncertainty and CTE
         for e in enemies_in_danger:
             e.health *= 0.5
@@ -86,35 +96,74 @@ class Ugv(Entity):
             logging.info('enemy {} health {}'.format(e.id, e.health))
         self.health -= 0.05
 
+    def path_progress(self):
+        """
+        Arc length (meters) covered along the current path, None when not following one
+        """
+        if self._current_path == '':
+            return None
+        return Ugv.compiled_path(self._current_path).progress(self._world.pos[self._slot],
+                                                              self._current_path_wp_index)
+
+    def predict_arrival(self):
+        """
+        Predicted ticks until go_to stops at its target waypoint, counting the tick it stops in.
+        None when not following a path or when the target is not a waypoint of the path ahead
+        """
+        if self._current_path == '' or self._final_wp is None:
+            return None
+        path = Ugv.compiled_path(self._current_path)
+        final_index = path.index_of(np.array([self._final_wp.x, self._final_wp.y, self._final_wp.z]),
+                                    self._current_path_wp_index)
+        if final_index is None:
+            return None
+        return path.ticks_to_end(self._world.pos[self._slot], self._world.target[self._slot],
+                                 self._current_path_wp_index, final_index, self._speed, Ugv.MAX_SPEED_MPS,
+                                 Ugv.MAX_ACC_MPS2, Ugv.MAX_SPEED_MPS * 2.0)
+
+    def _is_following_waypoint(self) -> bool:
+        # update() keeps going to the current waypoint of the path
+        return self._final_wp is not None and not self._reached_target(self._final_wp) and \
+            Ugv.compiled_path(self._current_path).is_at_waypoint(self._world.target[self._slot],
+                                                                 self._current_path_wp_index)
+
+    def _is_idle(self) -> bool:
+        if self._final_wp is None:
+            return True
+        # hovering at the last waypoint of the path
+        last_wp_index = len(Ugv.compiled_path(self._current_path)) - 1
+        return self._is_following_waypoint() and self._reached_target() and \
+            self._current_path_wp_index == last_wp_index and self._speed == 0.0 and not self._velocity_dir.any()
+
+    def _transit_guards(self):
+        if not self._is_following_waypoint() or self._reached_target():
+            return None
+        return [(self._target_pos, Ugv.MAX_SPEED_MPS * 2.0), (self._final_wp, Ugv.MAX_SPEED_MPS * 2.0)]
+
+    def _extra_state_size(self, num_enemies) -> int:
+        # path index, waypoint index, has final waypoint, final waypoint x, y, z
+        return super()._extra_state_size(num_enemies) + 6
+
+    def _save_extra_state(self, out, enemies):
+        out = super()._save_extra_state(out, enemies)
+        out[0] = sorted(Ugv.paths.keys()).index(self._current_path) if self._current_path != '' else -1
+        out[1] = self._current_path_wp_index
+        out[2] = self._final_wp is not None
+        out[3:6] = (self._final_wp.x, self._final_wp.y, self._final_wp.z) if self._final_wp is not None else 0.0
+        return out[6:]
+
+    def _restore_extra_state(self, buf, enemies):
+        buf = super()._restore_extra_state(buf, enemies)
+        path_index = int(buf[0])
+        self._current_path = sorted(Ugv.paths.keys())[path_index] if path_index >= 0 else ''
+        self._current_path_wp_index = int(buf[1])
+        self._final_wp = Pos.from_xyz(*buf[3:6]) if buf[2] else None
+        return buf[6:]
+
     def _reached_target(self, pos=None) -> bool:
         p = pos if (not (pos is None)) and isinstance(pos, Pos) else self._target_pos
         return self._pos.distance_to(p) <= Ugv.MAX_SPEED_MPS * 2.0
 
-    def _change_target(self, target_wp: Pos):
-        logging.debug("start pos {} velocity {} target_wp {}".format(self.pos, self.velocity, target_wp))
-        self._velocity_dir = np.array([target_wp.x - self._pos.x, target_wp.y - self._pos.y, target_wp.z - self._pos.z])
-        self._velocity_dir = self._velocity_dir / np.linalg.norm(self._velocity_dir)
-        self._speed = 0.0
-        self._target_pos = copy.copy(target_wp)
-        logging.debug("end pos {} velocity {} target_wp {}".format(self.pos, self.velocity, target_wp))
-
-    def _hover_in_place(self):
-        logging.debug("start pos {} velocity {} _target_pos {}".format(self.pos, self.velocity, self._target_pos))
-        self._velocity_dir = np.array([0.0, 0.0, 0.0], dtype=float)
-        self._speed = 0.0
-        # self._target_pos = self._pos
-        logging.debug("end pos {} velocity {} _target_pos {}".format(self.pos, self.velocity, self._target_pos))
-
-    def _continue_to_current_target(self):
-        logging.debug("start pos {} velocity {} _target_pos {}".format(self.pos, self.velocity, self._target_pos))
-        self._speed = max(self._speed + Ugv.MAX_ACC_MPS2, Ugv.MAX_SPEED_MPS)
-        self._velocity_dir = np.array(
-            [self._target_pos.x - self._pos.x, self._target_pos.y - self._pos.y, self._target_pos.z - self._pos.z])
-        self._velocity_dir = self._velocity_dir / np.linalg.norm(self._velocity_dir)
-        velocity = self._speed * self._velocity_dir
-        self._pos.add(velocity)
-        logging.debug("end pos {} velocity {} _target_pos {}".format(self.pos, self.velocity, self._target_pos))
-
     def update(self):
         if self._final_wp is not None:
             self.go_to(self._current_path, self._final_wp)
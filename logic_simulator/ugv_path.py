@@ -0,0 +1,143 @@
+import numpy as np
+from logic_simulator.pos import Pos
+
+
+def ticks_to_cover(distance, first_speed, acc):
+    """
+    Smallest numbers of ticks k with k * first_speed + acc * k * (k - 1) / 2 >= distance,
+    the distance covered when the speed grows by acc every tick after the first (see WorldState.advance)
+    distance, first_speed, acc - arrays (or scalars) broadcast together
+    """
+    distance, first_speed, acc = np.broadcast_arrays(np.asarray(distance, dtype=float),
+                                                     np.asarray(first_speed, dtype=float),
+                                                     np.asarray(acc, dtype=float))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = first_speed - acc / 2.0
+        k = np.where(acc > 0.0, (np.sqrt(b * b + 2.0 * acc * distance) - b) / acc, distance / first_speed)
+    return np.where(distance > 0.0, np.ceil(k - 1e-9), 0.0).astype(int)
+
+
+class UgvPath:
+    """
+    Ugv path compiled once into arrays: waypoints, unit directions and lengths of the segments
+    between them and the arc length at every waypoint
+    """
+
+    def __init__(self, waypoints):
+        assert isinstance(waypoints, list) and len(waypoints) > 0
+        self._waypoints = waypoints
+        self._points = np.array([[p.x, p.y, p.z] for p in waypoints], dtype=float)
+        segments = np.diff(self._points, axis=0)
+        self._lengths = np.linalg.norm(segments, axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self._directions = np.where(self._lengths[:, np.newaxis] > 0.0, segments / self._lengths[:, np.newaxis],
+                                        0.0)
+        self._arc_length = np.concatenate([[0.0], np.cumsum(self._lengths)])
+
+    @property
+    def waypoints(self):
+        """
+        the Pos list the path was compiled from
+        """
+        return self._waypoints
+
+    @property
+    def points(self):
+        return self._points
+
+    @property
+    def directions(self):
+        return self._directions
+
+    @property
+    def lengths(self):
+        return self._lengths
+
+    @property
+    def arc_length(self):
+        """
+        arc length of the path at every waypoint, 0 at the first one
+        """
+        return self._arc_length
+
+    @property
+    def length(self):
+        return self._arc_length[-1]
+
+    def __len__(self):
+        return len(self._points)
+
+    def is_at_waypoint(self, xyz, index) -> bool:
+        """
+        Pos.equals of xyz and the waypoint, without building a Pos
+        """
+        d = self._points[index] - xyz
+        return d[0] * d[0] + d[1] * d[1] + d[2] * d[2] <= Pos.EPSILON_DISTANCE ** 2
+
+    def progress(self, xyz, index):
+        """
+        Arc length covered by an entity at xyz on its way to waypoint index
+        """
+        to_waypoint = self._points[index] - xyz
+        return max(self._arc_length[index] - np.sqrt(np.dot(to_waypoint, to_waypoint)), 0.0)
+
+    def point_at(self, arc_length):
+        """
+        Point of the path at an arc length, clipped to the path ends
+        """
+        if len(self._lengths) == 0:
+            return self._points[0].copy()
+        arc_length = min(max(arc_length, 0.0), self.length)
+        i = min(np.searchsorted(self._arc_length, arc_length, side='right') - 1, len(self._lengths) - 1)
+        return self._points[i] + (arc_length - self._arc_length[i]) * self._directions[i]
+
+    def nearest(self, xyz):
+        """
+        Nearest point of the path to xyz, projected on all segments at once
+        returns arc length, point
+        """
+        if len(self._lengths) == 0:
+            return 0.0, self._points[0].copy()
+        along = np.einsum('ij,ij->i', np.asarray(xyz, dtype=float) - self._points[:-1], self._directions)
+        along = np.clip(along, 0.0, self._lengths)
+        candidates = self._points[:-1] + along[:, np.newaxis] * self._directions
+        i = int(np.argmin(np.linalg.norm(candidates - xyz, axis=1)))
+        return self._arc_length[i] + along[i], candidates[i]
+
+    def ticks_to_end(self, xyz, target, index, final_index, speed, max_speed, acc, radius):
+        """
+        Predicted ticks until an Ugv at xyz, going to waypoint index at speed, stops at waypoint final_index,
+        counting the tick it stops in. A waypoint counts as reached within radius, every tick reaching
+        one only changes the target (or stops the Ugv when it is within radius of waypoint final_index)
+        and every following segment starts from rest where the Ugv reached the waypoint, as in Ugv.go_to.
+        Passing within radius of waypoint final_index between waypoints is not checked.
+        target - the Ugv's current target, a tick changes it to waypoint index first when they differ
+        """
+        xyz = np.asarray(xyz, dtype=float)
+        final = self._points[final_index]
+        ticks = 0
+        if not self.is_at_waypoint(target, index):
+            ticks, speed = 1, 0.0
+        first_speed = max(speed + acc, max_speed)
+        for i in range(index, final_index + 1):
+            to_waypoint = self._points[i] - xyz
+            distance = np.sqrt(np.dot(to_waypoint, to_waypoint))
+            k = int(ticks_to_cover(distance - radius, first_speed, acc))
+            if k > 0:
+                xyz = xyz + (k * first_speed + acc * k * (k - 1) / 2.0) / distance * to_waypoint
+            # the moving ticks and the tick reaching waypoint i
+            ticks += k + 1
+            to_final = final - xyz
+            if i == final_index or np.sqrt(np.dot(to_final, to_final)) <= radius:
+                break
+            first_speed = max(acc, max_speed)
+        return ticks
+
+    def index_of(self, xyz, start=0):
+        """
+        First waypoint from start on at xyz (see is_at_waypoint), None if there is none
+        """
+        for index in range(start, len(self._points)):
+            if self.is_at_waypoint(xyz, index):
+                return index
+        return None
@@ -0,0 +1,132 @@
+from logic_simulator.world_state import WorldState
+from logic_simulator.logic_sim import LogicSim
+from logic_simulator.los import los_matrix
+from itertools import chain
+import numpy as np
+import gym
+
+
+class VecLogicSim:
+    """
+    N independent episodes of the same LogicSim scenario advanced in lockstep.
+    The entities of all episodes share one WorldState, so a step moves every entity of every
+    episode with a single WorldState.advance and gathers the observations with array indexing.
+    Finished episodes are reset automatically, their last observation is kept in
+    info['terminal_observation'] as stable-baselines VecEnvs do.
+
+    Observation row of one episode - LogicSim.flat_observation of the episode (positions relative to origin).
+    Action of one episode - one LogicSim.actions_from_array row per entity.
+    """
+    ENTITY_FEATURES = LogicSim.ENTITY_FEATURES
+    ENEMY_FEATURES = LogicSim.ENEMY_FEATURES
+    ACTION_FEATURES = 5
+
+    def __init__(self, make_sim, num_envs, origin=None):
+        """
+        make_sim - callable returning a new LogicSim of the scenario
+        origin - metric position subtracted from observed positions, defaults to the
+                start position of the first entity
+        """
+        assert num_envs > 0
+        self._sims = [make_sim() for _ in range(num_envs)]
+        num_entities = len(self._sims[0].entities)
+        num_enemies = len(self._sims[0].enemies)
+        assert all(len(sim.entities) == num_entities and len(sim.enemies) == num_enemies for sim in self._sims), \
+            'all episodes must be of the same scenario'
+
+        self._world = WorldState.pool(chain.from_iterable(chain(sim.entities, sim.enemies) for sim in self._sims))
+        self._world.batched = True
+        for sim in self._sims:
+            sim._bind_world(self._world)
+
+        self._entity_slots = np.array([[e._slot for e in sim.entities] for sim in self._sims], dtype=int)
+        self._enemy_slots = np.array([[e._slot for e in sim.enemies] for sim in self._sims], dtype=int)
+        self._enemy_priorities = np.array([[e.priority for e in sim.enemies] for sim in self._sims], dtype=np.float32)
+        first = next(iter(self._sims[0].entities))
+        self._origin = np.array([first._startpos.x, first._startpos.y, first._startpos.z] if origin is None else
+                                [origin.x, origin.y, origin.z])
+
+        self._num_entities = num_entities
+        self._num_enemies = num_enemies
+        obs_size = num_entities * VecLogicSim.ENTITY_FEATURES + num_enemies * VecLogicSim.ENEMY_FEATURES + \
+            num_entities * num_enemies
+        self._obs = np.zeros((num_envs, obs_size), dtype=np.float32)
+        # per section views of the observation buffer
+        entity_end = num_entities * VecLogicSim.ENTITY_FEATURES
+        enemy_end = entity_end + num_enemies * VecLogicSim.ENEMY_FEATURES
+        self._entities_obs = self._obs[:, :entity_end].reshape(num_envs, num_entities, VecLogicSim.ENTITY_FEATURES)
+        self._enemies_obs = self._obs[:, entity_end:enemy_end].reshape(num_envs, num_enemies,
+                                                                       VecLogicSim.ENEMY_FEATURES)
+        self._los_obs = self._obs[:, enemy_end:].reshape(num_envs, num_entities, num_enemies)
+        self.observation_space = gym.spaces.Box(low=-np.inf, high=np.inf, shape=(obs_size,), dtype=np.float32)
+        self.action_space = gym.spaces.Box(low=-np.inf, high=np.inf,
+                                           shape=(num_entities, VecLogicSim.ACTION_FEATURES), dtype=float)
+
+    @property
+    def num_envs(self):
+        return len(self._sims)
+
+    @property
+    def sims(self):
+        return self._sims
+
+    @property
+    def world(self) -> WorldState:
+        return self._world
+
+    def seed(self, seed=None):
+        """
+        Seed episode i with seed + i, None seeds every episode from fresh entropy
+        """
+        return [sim.seed(None if seed is None else seed + i)[0] for i, sim in enumerate(self._sims)]
+
+    def reset(self):
+        for sim in self._sims:
+            sim.reset()
+        return self._gather_obs().copy()
+
+    def step(self, actions):
+        """
+        actions - num_envs x num_entities x 5 array of LogicSim.actions_from_array rows
+        returns stacked observations, rewards, dones and a list of infos
+        """
+        assert len(actions) == self.num_envs
+        for sim, action_array in zip(self._sims, actions):
+            sim._begin_step(action_array)
+
+        self._world.advance()
+
+        for sim in self._sims:
+            sim._end_step()
+        rewards = np.array([sim.reward() for sim in self._sims], dtype=float)
+        dones = np.array([sim.is_done() for sim in self._sims], dtype=bool)
+        infos = [{} for _ in self._sims]
+        obs = self._gather_obs().copy()
+
+        finished = np.flatnonzero(dones)
+        for i in finished:
+            infos[i]['terminal_observation'] = obs[i].copy()
+            self._sims[i].reset()
+        if len(finished) > 0:
+            obs[finished] = self._gather_obs()[finished]
+        return obs, rewards, dones, infos
+
+    def close(self):
+        pass
+
+    def _gather_obs(self):
+        """
+        Write the observation of all episodes into the preallocated buffer
+        """
+        world = self._world
+        entity_slots = self._entity_slots
+        enemy_slots = self._enemy_slots
+
+        LogicSim.write_flat_obs(world, entity_slots, enemy_slots, self._origin, self._entities_obs, self._enemies_obs)
+        self._enemies_obs[..., 4] = self._enemy_priorities
+
+        # all episodes at once, each episode's entities against its own enemies
+        self._los_obs[...] = los_matrix(world.pos[entity_slots], world.looking_at[entity_slots],
+                                        world.max_range[entity_slots], world.fov[entity_slots],
+                                        world.pos[enemy_slots])
+        return self._obs
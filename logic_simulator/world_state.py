@@ -0,0 +1,212 @@
+from logic_simulator.pos import Pos
+import numpy as np
+
+
+class PosView(Pos):
+    """
+    Pos whose metric coordinates are a row of a WorldState array.
+    Moving the view moves the entity that owns the row.
+    """
+
+    def __init__(self, rows, slot):
+        self._xyz = rows[slot]
+        self._lat = None
+        self._lon = None
+        # x, y the cached lat/lon belong to, the row can be moved by WorldState without telling the view
+        self._lat_lon_xy = None
+
+    @property
+    def x(self):
+        return self._xyz[0]
+
+    @property
+    def y(self):
+        return self._xyz[1]
+
+    @property
+    def z(self):
+        return self._xyz[2]
+
+    def is_lat_lon_stale(self) -> bool:
+        return self._lat_lon_xy != (self._xyz[0], self._xyz[1])
+
+    def _set_lat_lon(self, lat, lon):
+        super()._set_lat_lon(lat, lon)
+        self._lat_lon_xy = (self._xyz[0], self._xyz[1])
+
+    def add(self, vec: np.array):
+        self._xyz += vec
+
+    def __copy__(self):
+        # a copy is a detached Pos, not another view of the same row
+        return Pos.from_xyz(*self._xyz)
+
+
+class WorldColumn:
+    """
+    Descriptor exposing an entity's row of a WorldState column as an attribute.
+    Assignment writes into the row, so the entity stays a view of the world.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        return getattr(entity._world, self._name)[entity._slot]
+
+    def __set__(self, entity, value):
+        getattr(entity._world, self._name)[entity._slot] = value
+
+
+class WorldPosColumn(WorldColumn):
+    """
+    Like WorldColumn but reads as a PosView. Assigning a Pos copies its coordinates.
+    """
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        return entity._views[self._name]
+
+    def __set__(self, entity, pos: Pos):
+        getattr(entity._world, self._name)[entity._slot] = (pos.x, pos.y, pos.z)
+
+
+class WorldState:
+    """
+    Structure-of-arrays state of a group of entities.
+    Every column is a view into one contiguous buffer, one row (slot) per entity,
+    so a whole step's kinematics can be advanced with a few NumPy operations.
+    """
+    POS = slice(0, 3)
+    VELOCITY_DIR = slice(3, 6)
+    TARGET = slice(6, 9)
+    LOOKING_AT = slice(9, 12)
+    SPEED = 12
+    HEALTH = 13
+    MAX_SPEED = 14
+    MAX_ACC = 15
+    FOV = 16
+    MAX_RANGE = 17
+    WIDTH = 18
+
+    POS_COLUMNS = ('pos', 'target', 'looking_at')
+
+    def __init__(self, capacity):
+        self._data = np.zeros((capacity, WorldState.WIDTH), dtype=float)
+        self.pos = self._data[:, WorldState.POS]
+        self.velocity_dir = self._data[:, WorldState.VELOCITY_DIR]
+        self.target = self._data[:, WorldState.TARGET]
+        self.looking_at = self._data[:, WorldState.LOOKING_AT]
+        self.speed = self._data[:, WorldState.SPEED]
+        self.health = self._data[:, WorldState.HEALTH]
+        self.max_speed = self._data[:, WorldState.MAX_SPEED]
+        self.max_acc = self._data[:, WorldState.MAX_ACC]
+        self.fov = self._data[:, WorldState.FOV]
+        self.max_range = self._data[:, WorldState.MAX_RANGE]
+        # slots asked to continue to their target during the current step
+        self.moving = np.zeros(capacity, dtype=bool)
+        # when batched, entities only flag themselves as moving and advance() integrates them together
+        self.batched = False
+        self._entities = []
+
+    @classmethod
+    def pool(cls, entities):
+        """
+        Create a world holding all given entities and rebind them to it
+        """
+        entities = list(entities)
+        world = cls(len(entities))
+        for e in entities:
+            world.add(e)
+        return world
+
+    @property
+    def capacity(self):
+        return self._data.shape[0]
+
+    @property
+    def entities(self):
+        return self._entities
+
+    def __len__(self):
+        return len(self._entities)
+
+    def add(self, entity) -> int:
+        """
+        Bind entity to the next free slot, carrying over its current state if already bound elsewhere
+        """
+        slot = len(self._entities)
+        assert slot < self.capacity, 'WorldState is full ({} slots)'.format(self.capacity)
+        if entity._world is not None:
+            self._data[slot] = entity._world._data[entity._slot]
+        self.max_speed[slot] = entity.MAX_SPEED_MPS
+        self.max_acc[slot] = entity.MAX_ACC_MPS2
+        entity._world = self
+        entity._slot = slot
+        entity._views = {name: PosView(getattr(self, name), slot) for name in WorldState.POS_COLUMNS}
+        self._entities.append(entity)
+        return slot
+
+    def get_rows(self, slots, out=None):
+        """
+        All columns of the given slots as a len(slots) x WIDTH array, written into out if given
+        """
+        return np.take(self._data, slots, axis=0, out=out)
+
+    def set_rows(self, slots, rows):
+        """
+        Overwrite all columns of the given slots, the slots stop moving
+        """
+        self._data[slots] = rows
+        self.moving[slots] = False
+
+    def lon_lat(self, column='pos'):
+        """
+        lon, lat arrays of all slots of a position column with a single inverse projection call
+        """
+        rows = getattr(self, column)[:len(self)]
+        return Pos.myProjPsik(rows[:, 0], rows[:, 1], inverse=True)
+
+    def advance(self):
+        """
+        Move every slot flagged as moving one step towards its target
+        """
+        if not self.moving.any():
+            return
+        idx = np.flatnonzero(self.moving)
+        speed = np.maximum(self.speed[idx] + self.max_acc[idx], self.max_speed[idx])
+        direction = self.target[idx] - self.pos[idx]
+        direction /= np.linalg.norm(direction, axis=1)[:, np.newaxis]
+        self.speed[idx] = speed
+        self.velocity_dir[idx] = direction
+        self.pos[idx] += speed[:, np.newaxis] * direction
+        self.moving[idx] = False
+
+    def transit_distance(self, slots, ticks):
+        """
+        Distance advance() moves each slot within every number of ticks, while the slots keep moving to the same target
+        ticks - array of numbers of ticks
+        returns len(slots) x len(ticks) array
+        """
+        first_speed = np.maximum(self.speed[slots] + self.max_acc[slots], self.max_speed[slots])
+        # after the first tick the speed grows by max_acc every tick
+        return np.multiply.outer(first_speed, ticks) + \
+            np.multiply.outer(self.max_acc[slots], ticks * (ticks - 1) / 2.0)
+
+    def advance_ticks(self, slots, ticks):
+        """
+        Closed form of ticks advance() calls with the slots moving, valid while none of them passes its target
+        """
+        if ticks <= 0 or len(slots) == 0:
+            return
+        direction = self.target[slots] - self.pos[slots]
+        direction /= np.linalg.norm(direction, axis=1)[:, np.newaxis]
+        first_speed = np.maximum(self.speed[slots] + self.max_acc[slots], self.max_speed[slots])
+        distance = self.transit_distance(slots, np.array([ticks]))[:, 0]
+        self.speed[slots] = first_speed + (ticks - 1) * self.max_acc[slots]
+        self.velocity_dir[slots] = direction
+        self.pos[slots] += distance[:, np.newaxis] * direction
+        self.moving[slots] = False
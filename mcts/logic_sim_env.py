@@ -0,0 +1,186 @@
+from collections import namedtuple
+import logging
+import numpy as np
+import gym
+from logic_simulator.logic_sim import LogicSim
+from logic_simulator.ugv import Ugv
+
+# LogicSim as a search environment for mcts.Mcts.
+# Search chooses among a discrete set of macro actions, each commanding one entity to a named target
+# (or no entity, WAIT) and then letting the simulation run for up to ticks_per_action ticks.
+# With progressive widening (Mcts widening) it also takes commands to continuous targets,
+# (entity index, action code, x, y, z, path index) tuples proposed by sample_action.
+# Playouts fork the simulator with LogicSim.snapshot / restore instead of copying it.
+
+MacroAction = namedtuple('MacroAction', ['name', 'actions'])
+
+
+def _action_row(code, pos, path_index=0):
+    return [code, pos.x, pos.y, pos.z, path_index]
+
+
+def macro_actions(sim: LogicSim, waypoints=None, look_targets=None, attack_targets=None):
+    """
+    WAIT, then every command an entity of sim can take to a named target, as LogicSim action arrays
+    waypoints - name to Pos, MOVE_TO targets
+    look_targets - name to Pos, LOOK_AT targets
+    attack_targets - name to Pos, ATTACK targets
+    TAKE_PATH goes to the last waypoint of every path of Ugv.paths
+    returns list of MacroAction
+    """
+    def rows(named):
+        # a target out of the metric frame (e.g. an invalid lat/lon) can not be reached, no macro goes there
+        valid = {}
+        for name, pos in (named or {}).items():
+            if np.isfinite([pos.x, pos.y, pos.z]).all():
+                valid[name] = pos
+            else:
+                logging.warning('macro_actions skips target %s, its metric position is not finite', name)
+        return [(name, _action_row(0, pos)) for name, pos in valid.items()]
+
+    path_ids = sorted(Ugv.paths.keys())
+    targets = {
+        'MOVE_TO': rows(waypoints),
+        'LOOK_AT': rows(look_targets),
+        'ATTACK': rows(attack_targets),
+        'TAKE_PATH': [(path_id, _action_row(0, Ugv.paths[path_id][-1], i)) for i, path_id in enumerate(path_ids)],
+    }
+    entities = list(sim.entities)
+    no_action = np.full((len(entities), 5), float(LogicSim.NO_ACTION))
+    macros = [MacroAction('WAIT', no_action)]
+    for i, entity in enumerate(entities):
+        for code, action_name in enumerate(LogicSim.ACTIONS):
+            if LogicSim.ACTIONS_TO_METHODS[action_name].get(entity.__class__) is None:
+                continue
+            for target_name, row in targets[action_name]:
+                actions = no_action.copy()
+                actions[i] = row
+                actions[i, 0] = code
+                macros.append(MacroAction('{} {} {}'.format(entity.id, action_name, target_name), actions))
+    return macros
+
+
+class LogicSimSearchEnv(gym.Env):
+    """
+    sim - the LogicSim to search, a clone of it with flat observations is searched so it is left untouched.
+            Observations returned by reset and step are overwritten by the next call
+    macros - list of MacroAction, see macro_actions
+    ticks_per_action - ticks a macro action runs for, less when the episode ends
+    kill_reward, loss_penalty - reward of every enemy killed and of every entity lost during an action,
+            added to the rewards of LogicSim.reward
+    key_cell_size, key_health_levels - discretization of state_key, see LogicSim.state_key
+    proposal_std - meters of the gaussian step sample_action moves MOVE_TO and LOOK_AT targets by
+    uniform_fraction - fraction of sample_action targets drawn uniformly from the target box of
+            LogicSim.action_space (around sim.origin) instead
+    """
+
+    def __init__(self, sim: LogicSim, macros, ticks_per_action=10, kill_reward=1.0, loss_penalty=-0.5,
+                 key_cell_size=5.0, key_health_levels=4, proposal_std=10.0, uniform_fraction=0.1):
+        assert ticks_per_action >= 1
+        # playouts drop every observation, the simulator's buffer is returned without copying
+        self._sim = sim.clone(flat_obs=True, reuse_obs=True)
+        self._macros = macros
+        self._ticks_per_action = ticks_per_action
+        self._kill_reward = kill_reward
+        self._loss_penalty = loss_penalty
+        self._key_cell_size = key_cell_size
+        self._key_health_levels = key_health_levels
+        self._no_action = macros[0].actions if macros[0].name == 'WAIT' else \
+            np.full((len(sim.entities), 5), float(LogicSim.NO_ACTION))
+        self._proposal_std = proposal_std
+        self._uniform_fraction = uniform_fraction
+        self._continuous = (LogicSim.ACTIONS.index('MOVE_TO'), LogicSim.ACTIONS.index('LOOK_AT'))
+        box = sim.action_space.spaces[0].spaces[1]
+        self._target_low = sim.origin + box.low
+        self._target_high = sim.origin + box.high
+        self.action_space = gym.spaces.Discrete(len(macros))
+        self.observation_space = self._sim.observation_space
+
+    @property
+    def sim(self) -> LogicSim:
+        return self._sim
+
+    @property
+    def macros(self):
+        return self._macros
+
+    def sync(self, sim: LogicSim):
+        """
+        Continue from the current state of sim (the LogicSim this environment was made from, or a clone of it)
+        """
+        self._sim.restore(sim.snapshot())
+
+    def snapshot(self):
+        return self._sim.snapshot()
+
+    def restore(self, snapshot):
+        self._sim.restore(snapshot)
+
+    def reset(self):
+        return self._sim.reset()
+
+    def state_key(self):
+        """
+        transposition key of the current state, see mcts.TranspositionTable
+        """
+        return self._sim.state_key(self._key_cell_size, self._key_health_levels)
+
+    def sample_action(self, rng=np.random):
+        """
+        A random macro action as a command tuple, MOVE_TO and LOOK_AT targets moved by a proposal_std
+        gaussian step in x, y or, uniform_fraction of the times, drawn uniformly from the target box
+        returns (entity index, action code, x, y, z, path index), () for WAIT
+        """
+        actions = self._macros[rng.randint(len(self._macros))].actions
+        commanded = np.flatnonzero(actions[:, 0] != LogicSim.NO_ACTION)
+        if len(commanded) == 0:
+            return ()
+        i = commanded[0]
+        code, x, y, z, path_index = actions[i]
+        if int(code) in self._continuous:
+            if rng.random_sample() < self._uniform_fraction:
+                x, y = rng.uniform(self._target_low[:2], self._target_high[:2])
+            else:
+                x, y = rng.normal((x, y), self._proposal_std)
+        return int(i), int(code), float(x), float(y), float(z), int(path_index)
+
+    def actions_of(self, action):
+        """
+        LogicSim action array of a macro index or a command tuple
+        """
+        if not isinstance(action, tuple):
+            return self._macros[action].actions
+        actions = self._no_action.copy()
+        if len(action) > 0:
+            actions[action[0]] = action[1:]
+        return actions
+
+    def action_name(self, action):
+        if not isinstance(action, tuple):
+            return self._macros[action].name
+        if len(action) == 0:
+            return 'WAIT'
+        entity = list(self._sim.entities)[action[0]]
+        return '{} {} ({:.1f}, {:.1f}, {:.1f})'.format(entity.id, LogicSim.ACTIONS[action[1]], *action[2:5])
+
+    def _casualties(self):
+        world = self._sim.world
+        return np.count_nonzero(world.health[self._sim.enemy_slots] <= 0.0), \
+            np.count_nonzero(world.health[self._sim.entity_slots] <= 0.0)
+
+    def step(self, action):
+        """
+        action - index of the macro action, or a command tuple (see sample_action)
+        returns obs, reward, done, info with info['ticks'] the number of ticks advanced
+        """
+        sim = self._sim
+        dead, lost = self._casualties()
+        obs, reward, done, info = sim.step_to_event(self.actions_of(action), max_ticks=self._ticks_per_action)
+        ticks = info['ticks']
+        while not done and ticks < self._ticks_per_action:
+            obs, r, done, info = sim.step_to_event(self._no_action, max_ticks=self._ticks_per_action - ticks)
+            reward += r
+            ticks += info['ticks']
+        new_dead, new_lost = self._casualties()
+        reward += self._kill_reward * (new_dead - dead) + self._loss_penalty * (new_lost - lost)
+        return obs, reward, done, {'ticks': ticks}
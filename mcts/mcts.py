@@ -2,11 +2,23 @@
 #  modifications:
 #  migrations to python3
 #  add env.reset() after termination
+#  search one action at a time (Mcts), forking environments with snapshot() / restore() when they have them
+#  root parallel search on a process pool (RootParallelMcts)
+#  tree parallel search with virtual loss on threads (TreeParallelMcts)
+#  transposition table sharing the nodes of equal states (TranspositionTable)
+#  progressive widening for continuous action spaces (Mcts widening)
+#  tree reuse across decisions (Mcts.advance), node values are returns from the parent's state on
+#  array backed nodes (NodeStore, CompactMcts)
 import os
 import gym
 import sys
 import random
 import itertools
+import multiprocessing
+from collections import OrderedDict
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from time import time
 from copy import copy
 from math import sqrt, log
@@ -23,8 +35,14 @@ def moving_average(v, n):
     return ret
 
 
-def ucb(node):
-    return node.value / node.visits + sqrt(log(node.parent.visits)/node.visits)
+def ucb(node, exploration=1.0, virtual_loss=0.0):
+    # playouts still descending through a node count as visits that lost virtual_loss each
+    visits = node.visits + node.pending
+    if visits == 0:
+        # e.g. selected by a tree parallel playout that ended before reaching it, not explored yet
+        return float('inf')
+    value = node.value - virtual_loss * node.pending
+    return value / visits + exploration * sqrt(log(node.parent.visits + node.parent.pending)/visits)
 
 
 def combinations(space):
@@ -33,7 +51,16 @@ def combinations(space):
     elif isinstance(space, gym.spaces.Tuple):
         return itertools.product(*[combinations(s) for s in space.spaces])
     else:
-        raise NotImplementedError
+        raise NotImplementedError('can not enumerate {}, search it with Mcts widening'.format(space))
+
+
+def hashable(action):
+    # sampled actions as node actions, numpy arrays become tuples
+    if isinstance(action, np.ndarray):
+        return tuple(action.tolist())
+    if isinstance(action, (tuple, list)):
+        return tuple(hashable(a) for a in action)
+    return action
 
 
 class Node:
@@ -44,12 +71,690 @@ class Node:
         self.explored_children = 0
         self.visits = 0
         self.value = 0
+        # playouts of a tree parallel search that went through the node and are not backpropagated yet
+        self.pending = 0
+        # transposition key of the node's state, None until a playout reached it
+        self.key = None
+        # node of the same state key the search continues from, its children and statistics are shared
+        self.transposition = None
+
+
+class TranspositionTable:
+    """
+    Node of every state key, so that states reached through different action orders share one node.
+    A node reaching a known key keeps its own action and statistics (those its parent selects by)
+    and links to the shared node, whose subtree and statistics grow from the playouts of all its links.
+    capacity - keys kept, the least recently used key is evicted first. An evicted node stays in the tree,
+            only later transpositions to it are missed
+    """
+
+    def __init__(self, capacity=100000):
+        assert capacity > 0
+        self._capacity = capacity
+        self._nodes = OrderedDict()
+        self.hits = 0
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def clear(self):
+        self._nodes.clear()
+        self.hits = 0
+
+    def lookup(self, key, node):
+        """
+        The node of key, node itself if key is new
+        """
+        shared = self._nodes.get(key)
+        if shared is not None:
+            self._nodes.move_to_end(key)
+            self.hits += 1
+            return shared
+        self._nodes[key] = node
+        if len(self._nodes) > self._capacity:
+            self._nodes.popitem(last=False)
+        return node
+
+
+class NodeStore:
+    """
+    Tree nodes as the rows of preallocated arrays, the arrays double when full.
+    The children of a node are the consecutive rows first_child .. first_child + child_count, so selection
+    scores all of them at once (best_child). link is the row of the shared node of a transposition, -1 if none.
+    capacity - rows allocated up front
+    keys - keep a transposition key per row
+    """
+    FIELDS = (('parent', np.int32), ('action', np.int32), ('first_child', np.int32), ('child_count', np.int32),
+              ('explored', np.int32), ('visits', np.int32), ('value', np.float64), ('link', np.int32))
+
+    def __init__(self, capacity=1024, keys=False):
+        assert capacity > 0
+        self._size = 0
+        for name, dtype in NodeStore.FIELDS:
+            setattr(self, name, np.empty(capacity, dtype=dtype))
+        self.key = np.empty(capacity, dtype=object) if keys else None
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self):
+        return len(self.parent)
+
+    @property
+    def nbytes(self):
+        """
+        bytes of the arrays, transposition keys not included
+        """
+        return sum(getattr(self, name).nbytes for name, _ in NodeStore.FIELDS)
+
+    def clear(self):
+        self._size = 0
+
+    def _grow(self, size):
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        for name, _ in NodeStore.FIELDS + (('key', None),):
+            old = getattr(self, name)
+            if old is not None:
+                new = np.empty(capacity, dtype=old.dtype)
+                new[:self._size] = old[:self._size]
+                setattr(self, name, new)
+
+    def _allocate(self, n, parent):
+        # n new leaf rows, returns the first one
+        first = self._size
+        if first + n > self.capacity:
+            self._grow(first + n)
+        rows = slice(first, first + n)
+        self.parent[rows] = parent
+        self.first_child[rows] = 0
+        self.child_count[rows] = 0
+        self.explored[rows] = 0
+        self.visits[rows] = 0
+        self.value[rows] = 0.0
+        self.link[rows] = -1
+        if self.key is not None:
+            self.key[rows] = None
+        self._size += n
+        return first
+
+    def add_root(self):
+        root = self._allocate(1, -1)
+        self.action[root] = -1
+        return root
+
+    def add_children(self, node, actions):
+        """
+        Expand node with a child of every action id in actions, in that order
+        """
+        first = self._allocate(len(actions), node)
+        self.action[first:first + len(actions)] = actions
+        self.first_child[node] = first
+        self.child_count[node] = len(actions)
+
+    def children(self, node):
+        first = self.first_child[node]
+        return range(first, first + self.child_count[node])
+
+    def best_child(self, node, exploration=1.0):
+        """
+        The child of node of highest ucb, every child must have been visited
+        """
+        first = int(self.first_child[node])
+        rows = slice(first, first + int(self.child_count[node]))
+        visits = self.visits[rows]
+        # value / visits + exploration * sqrt(log(parent visits) / visits) over one division
+        scores = self.value[rows] + exploration * sqrt(log(self.visits[node])) * np.sqrt(visits)
+        scores /= visits
+        return first + int(scores.argmax())
+
+    def compact(self, root):
+        """
+        Keep the subtree of root only, renumbered from row 0 (root) on.
+        Links out of the subtree are dropped with their keys, the next playout looks the key up again
+        """
+        # breadth first the children of every kept node stay consecutive
+        order = [root]
+        i = 0
+        while i < len(order):
+            count = self.child_count[order[i]]
+            if count > 0:
+                first = self.first_child[order[i]]
+                order.extend(range(first, first + count))
+            i += 1
+        order = np.array(order)
+        renumber = np.full(self._size, -1, dtype=np.int32)
+        renumber[order] = np.arange(len(order), dtype=np.int32)
+        for name, _ in NodeStore.FIELDS + (('key', None),):
+            array = getattr(self, name)
+            if array is not None:
+                array[:len(order)] = array[order]
+        self._size = len(order)
+        kept = slice(0, self._size)
+        self.parent[0] = -1
+        self.parent[1:self._size] = renumber[self.parent[1:self._size]]
+        self.first_child[kept] = np.where(self.child_count[kept] > 0, renumber[self.first_child[kept]], 0)
+        linked = self.link[kept] >= 0
+        self.link[kept] = np.where(linked, renumber[np.where(linked, self.link[kept], 0)], -1)
+        if self.key is not None:
+            self.key[np.flatnonzero(linked & (self.link[kept] < 0))] = None
+        return 0
+
+
+class Mcts:
+    """
+    UCT search of the next action of an environment, one decision at a time.
+    Every playout starts from the environment's current state: environments with snapshot() / restore()
+    (e.g. mcts.logic_sim_env.LogicSimSearchEnv) are restored in place and left in the state the search
+    started from. Others are copied with copy(env), a shallow copy: state it shares with the environment
+    (e.g. the inner environment of a gym wrapper) is changed by the playouts.
+    A search grows the subtree advance() kept from the previous search, a new tree otherwise.
+    The value of a node sums the returns of its playouts from its parent's state on, so a subtree
+    keeps meaning the same after its root is promoted.
+    max_depth - actions of a playout past which it is cut with depth_penalty
+    transpositions - optional TranspositionTable, the environment must have state_key()
+    widening - optional (k, alpha) progressive widening for action spaces that can not be enumerated:
+            a node gets a new child whenever it has less than k * visits ** alpha of them, of an action
+            proposed by env.sample_action() if the environment has it, action_space.sample() otherwise
+    """
+
+    def __init__(self, env, max_depth=1000, exploration=1.0, depth_penalty=100.0, transpositions=None,
+                 widening=None):
+        self.env = env
+        self.max_depth = max_depth
+        self.exploration = exploration
+        self.depth_penalty = depth_penalty
+        self.transpositions = transpositions
+        self.widening = widening
+        self.root = Node(None, None)
+        self._in_place = hasattr(env, 'snapshot') and hasattr(env, 'restore')
+        self._advanced = False
+
+    def reset(self):
+        """
+        Drop the tree, the next search starts a new one (e.g. at the start of an episode)
+        """
+        self.root = Node(None, None)
+        self._advanced = False
+        if self.transpositions is not None:
+            self.transpositions.clear()
+
+    def advance(self, action):
+        """
+        Promote the child of action to the root and drop its siblings, call it after committing action
+        to the environment so the next search continues from the statistics gathered for it
+        """
+        child = next((n for n in self.root.children if n.action == action), None)
+        if child is None:
+            self.reset()
+            return
+        self.root = child.transposition if child.transposition is not None else child
+        self.root.parent = None
+        self._advanced = True
+        if self.transpositions is not None:
+            # the dropped siblings leave the table, the nodes of the kept subtree are registered again
+            self.transpositions.clear()
+            stack = [self.root]
+            while stack:
+                node = stack.pop()
+                if node.key is not None and node.transposition is None:
+                    self.transpositions.lookup(node.key, node)
+                stack.extend(node.children)
+
+    def _begin_search(self):
+        # the subtree kept by advance, or a new tree
+        if not self._advanced:
+            self.reset()
+        self._advanced = False
+
+    def search(self, playouts, time_budget=None):
+        """
+        Grow the tree of the current state
+        playouts - number of playouts
+        time_budget - optional seconds after which the search stops, whatever playouts are left
+        returns the most visited action of the root, see best_action
+        """
+        self._begin_search()
+        root_state = self.env.snapshot() if self._in_place else None
+        start_time = time()
+        for i in range(playouts):
+            if time_budget is not None and time() - start_time > time_budget:
+                break
+            if self._in_place:
+                self.env.restore(root_state)
+                state = self.env
+            else:
+                state = copy(self.env)
+            self._playout(state)
+        if self._in_place:
+            self.env.restore(root_state)
+        return self.best_action()
+
+    def best_action(self):
+        """
+        The most visited action of the root, a random one when the root was not expanded
+        (no playout ran, or its state is terminal)
+        """
+        if not self.root.children:
+            return self.env.action_space.sample()
+        return max(self.root.children, key=lambda n: n.visits).action
+
+    def root_stats(self):
+        """
+        returns dictionary of the root actions to their (visits, value)
+        """
+        return {n.action: (n.visits, n.value) for n in self.root.children}
+
+    def _playout(self, state):
+        sum_reward = 0
+        node = self.root
+        path = [node]
+        # rewards before the step into every node of path
+        before = [0]
+        terminal = False
+        depth = 0
+
+        # selection
+        while node.children or self.widening is not None:
+            widen = self.widening is not None and \
+                len(node.children) < self.widening[0] * max(node.visits, 1) ** self.widening[1]
+            # a proposal matching an existing child adds nothing, the node selects by ucb as without widening
+            child = self._widen(node, state) if widen else None
+            widened = child is not None
+            if widened:
+                node = child
+            elif node.explored_children < len(node.children):
+                child = node.children[node.explored_children]
+                node.explored_children += 1
+                node = child
+            else:
+                node = max(node.children, key=lambda n: ucb(n, self.exploration))
+            before.append(sum_reward)
+            _, reward, terminal, _ = state.step(node.action)
+            sum_reward += reward
+            depth += 1
+            if self.transpositions is not None and node.key is None:
+                node.key = state.state_key()
+                shared = self.transpositions.lookup(node.key, node)
+                node.transposition = shared if shared is not node else None
+            path.append(node)
+            if node.transposition is not None:
+                node = node.transposition
+                path.append(node)
+                before.append(before[-1])
+            if terminal or widened:
+                break
+
+        # expansion
+        if not terminal and self.widening is None:
+            node.children = [Node(node, a) for a in combinations(state.action_space)]
+            random.shuffle(node.children)
+
+        # playout
+        if not terminal:
+            sum_reward += self._rollout(state, depth)
+
+        # backpropagate along the path, through the shared nodes of transpositions
+        for node, reward_before in zip(path, before):
+            node.visits += 1
+            node.value += sum_reward - reward_before
+
+    def _widen(self, node, state):
+        # new child of a proposed action, None if the action was proposed before
+        sample = state.sample_action if hasattr(state, 'sample_action') else state.action_space.sample
+        action = hashable(sample())
+        if any(child.action == action for child in node.children):
+            return None
+        node.children.append(Node(node, action))
+        # the playout visits the new child, ucb selects among all the children afterwards
+        node.explored_children = len(node.children)
+        return node.children[-1]
+
+    def _rollout(self, state, depth):
+        # random actions from a non terminal state at depth, returns their sum of rewards
+        sum_reward = 0
+        terminal = False
+        while not terminal:
+            action = state.action_space.sample()
+            _, reward, terminal, _ = state.step(action)
+            sum_reward += reward
+            depth += 1
+
+            if depth > self.max_depth:
+                sum_reward -= self.depth_penalty
+                break
+        return sum_reward
+
+
+class CompactMcts(Mcts):
+    """
+    Mcts on a NodeStore instead of Node objects, for the large trees of many playouts over enumerable
+    action spaces: a node takes a few dozen bytes and selection scores the children of a node at once.
+    Nodes refer to actions by their index in the enumeration of action_space (combinations).
+    capacity - nodes allocated up front, the store grows when a search needs more
+    The other arguments are those of Mcts, progressive widening is not supported
+    """
+
+    def __init__(self, env, max_depth=1000, exploration=1.0, depth_penalty=100.0, transpositions=None,
+                 capacity=1024):
+        super().__init__(env, max_depth, exploration, depth_penalty, transpositions)
+        self._actions = list(combinations(env.action_space))
+        self._action_ids = {a: i for i, a in enumerate(self._actions)}
+        self.nodes = NodeStore(capacity, keys=transpositions is not None)
+        self.root = self.nodes.add_root()
+
+    def reset(self):
+        self.nodes.clear()
+        self.root = self.nodes.add_root()
+        self._advanced = False
+        if self.transpositions is not None:
+            self.transpositions.clear()
+
+    def advance(self, action):
+        nodes = self.nodes
+        action_id = self._action_ids.get(action, -1)
+        child = next((n for n in nodes.children(self.root) if nodes.action[n] == action_id), None)
+        if child is None:
+            self.reset()
+            return
+        self.root = nodes.compact(nodes.link[child] if nodes.link[child] >= 0 else child)
+        self._advanced = True
+        if self.transpositions is not None:
+            self.transpositions.clear()
+            for n in range(len(nodes)):
+                if nodes.key[n] is not None and nodes.link[n] < 0:
+                    self.transpositions.lookup(nodes.key[n], n)
+
+    def best_action(self):
+        nodes = self.nodes
+        if nodes.child_count[self.root] == 0:
+            return self.env.action_space.sample()
+        first = nodes.first_child[self.root]
+        best = first + int(np.argmax(nodes.visits[first:first + nodes.child_count[self.root]]))
+        return self._actions[nodes.action[best]]
+
+    def root_stats(self):
+        nodes = self.nodes
+        return {self._actions[nodes.action[n]]: (int(nodes.visits[n]), float(nodes.value[n]))
+                for n in nodes.children(self.root)}
+
+    def _playout(self, state):
+        nodes = self.nodes
+        sum_reward = 0
+        node = self.root
+        path = [node]
+        # rewards before the step into every node of path
+        before = [0]
+        terminal = False
+        depth = 0
+
+        # selection
+        while nodes.child_count[node] > 0:
+            explored = nodes.explored[node]
+            if explored < nodes.child_count[node]:
+                nodes.explored[node] = explored + 1
+                node = int(nodes.first_child[node] + explored)
+            else:
+                node = nodes.best_child(node, self.exploration)
+            before.append(sum_reward)
+            _, reward, terminal, _ = state.step(self._actions[nodes.action[node]])
+            sum_reward += reward
+            depth += 1
+            if self.transpositions is not None and nodes.key[node] is None:
+                nodes.key[node] = state.state_key()
+                shared = self.transpositions.lookup(nodes.key[node], node)
+                if shared != node:
+                    nodes.link[node] = shared
+            path.append(node)
+            if nodes.link[node] >= 0:
+                node = int(nodes.link[node])
+                path.append(node)
+                before.append(before[-1])
+            if terminal:
+                break
+
+        # expansion
+        if not terminal:
+            actions = list(range(len(self._actions)))
+            random.shuffle(actions)
+            nodes.add_children(node, actions)
+
+        # playout
+        if not terminal:
+            sum_reward += self._rollout(state, depth)
+
+        # backpropagate along the path, through the shared nodes of transpositions
+        for node, reward_before in zip(path, before):
+            nodes.visits[node] += 1
+            nodes.value[node] += sum_reward - reward_before
+
+
+# root parallel workers, each searches its own environment built once by make_env
+_worker_search = None
+
+
+def _init_search_worker(make_env, mcts_kwargs):
+    global _worker_search
+    _worker_search = Mcts(make_env(), **mcts_kwargs)
+
+
+def _search_root(args):
+    snapshot, playouts, time_budget, seed = args
+    random.seed(seed)
+    np.random.seed(seed % (2 ** 32))
+    env = _worker_search.env
+    env.action_space.seed(seed)
+    env.restore(snapshot)
+    _worker_search.search(playouts, time_budget)
+    return _worker_search.root_stats()
+
+
+class RootParallelMcts:
+    """
+    Root parallel Mcts: every worker process grows its own tree from the same root state with its own seed,
+    the visits and values of the root actions of all trees are summed to choose the action.
+    make_env - builds the environment of a worker, it must have snapshot() / restore() and restore
+            the snapshots of the searched environment. Sent to the workers, it must be picklable
+    num_workers - pool size, defaults to the number of cores
+    seed - seed of the first worker in the first search, every search and worker gets its own
+    The other arguments are those of Mcts
+    """
+
+    def __init__(self, make_env, num_workers=None, max_depth=1000, exploration=1.0, depth_penalty=100.0, seed=0,
+                 transpositions=None, widening=None):
+        self._num_workers = multiprocessing.cpu_count() if num_workers is None else num_workers
+        assert self._num_workers > 0
+        self._seed = seed
+        self._searches = 0
+        self._root_stats = {}
+        # every worker gets its own copy of the transposition table
+        mcts_kwargs = {'max_depth': max_depth, 'exploration': exploration, 'depth_penalty': depth_penalty,
+                       'transpositions': transpositions, 'widening': widening}
+        self._pool = multiprocessing.Pool(self._num_workers, initializer=_init_search_worker,
+                                          initargs=(make_env, mcts_kwargs))
+
+    @property
+    def num_workers(self):
+        return self._num_workers
+
+    def search(self, env, playouts, time_budget=None):
+        """
+        Search the current state of env
+        playouts - playouts of every worker
+        time_budget - optional seconds after which every worker stops
+        returns the action with most visits over all trees, a random one when no tree expanded its root
+        """
+        snapshot = env.snapshot()
+        first_seed = self._seed + self._searches * self._num_workers
+        self._searches += 1
+        tasks = [(snapshot, playouts, time_budget, first_seed + k) for k in range(self._num_workers)]
+        merged = {}
+        for stats in self._pool.map(_search_root, tasks):
+            for action, (visits, value) in stats.items():
+                total_visits, total_value = merged.get(action, (0, 0))
+                merged[action] = (total_visits + visits, total_value + value)
+        self._root_stats = merged
+        if not merged:
+            # no worker expanded the root, see Mcts.best_action
+            return env.action_space.sample()
+        return max(merged.items(), key=lambda item: item[1][0])[0]
+
+    def root_stats(self):
+        """
+        returns dictionary of the root actions of the last search to their (visits, value) summed over all trees
+        """
+        return self._root_stats
+
+    def close(self):
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TreeParallelMcts(Mcts):
+    """
+    Tree parallel Mcts: num_workers threads run playouts on one shared tree, each on its own environment.
+    A thread picks its path from the root under the tree lock, marking every node of it pending, so that ucb
+    counts the node as visited with a loss of virtual_loss and the other threads spread over other branches.
+    It then replays the path and rolls out on its environment without the lock, and backpropagates atomically
+    under the lock, clearing the pending marks.
+    The threads share the GIL: environments stepping in pure Python (e.g. LogicSimSearchEnv) run no more
+    playouts per second than the serial Mcts (about 150 per second on the ambush scenario with 1, 2 or 4
+    threads), so this does not buy deeper plans on more cores. Use RootParallelMcts for that, or this class
+    with environments that release the GIL while stepping.
+    make_env - builds the environment of a thread, it must have snapshot() / restore() and restore
+            the snapshots of the searched environment
+    seed - seed of the action spaces of the threads
+    The other arguments are those of Mcts
+    """
+
+    def __init__(self, make_env, num_workers=4, max_depth=1000, exploration=1.0, depth_penalty=100.0,
+                 virtual_loss=1.0, seed=0):
+        assert num_workers > 0
+        self._envs = [make_env() for _ in range(num_workers)]
+        super().__init__(self._envs[0], max_depth, exploration, depth_penalty)
+        self.virtual_loss = virtual_loss
+        for k, env in enumerate(self._envs):
+            env.action_space.seed(seed + k)
+        self._lock = threading.Lock()
+
+    @property
+    def num_workers(self):
+        return len(self._envs)
+
+    def search(self, env, playouts, time_budget=None):
+        """
+        Grow the tree of the current state of env
+        playouts - number of playouts of all threads together
+        time_budget - optional seconds after which the threads stop
+        returns the most visited action of the root, see best_action
+        """
+        self._begin_search()
+        root_state = env.snapshot()
+        start_time = time()
+        remaining = [playouts]
+
+        def work(state):
+            while True:
+                with self._lock:
+                    if remaining[0] <= 0 or (time_budget is not None and time() - start_time > time_budget):
+                        return
+                    remaining[0] -= 1
+                state.restore(root_state)
+                self._parallel_playout(state)
+
+        with ThreadPoolExecutor(len(self._envs)) as executor:
+            futures = [executor.submit(work, state) for state in self._envs]
+        # raises the exception of a failed thread
+        for future in futures:
+            future.result()
+        return self.best_action()
+
+    def _select_path(self):
+        # under the lock, the nodes from the root to a leaf, marked pending
+        node = self.root
+        node.pending += 1
+        path = [node]
+        while node.children:
+            if node.explored_children < len(node.children):
+                child = node.children[node.explored_children]
+                node.explored_children += 1
+                node = child
+            else:
+                node = max(node.children, key=lambda n: ucb(n, self.exploration, self.virtual_loss))
+            node.pending += 1
+            path.append(node)
+        return path
+
+    def _parallel_playout(self, state):
+        with self._lock:
+            path = self._select_path()
+
+        sum_reward = 0
+        # rewards before the step into every node of path
+        before = [0]
+        terminal = False
+        reached = 0
+        for reached in range(1, len(path)):
+            _, reward, terminal, _ = state.step(path[reached].action)
+            before.append(sum_reward)
+            sum_reward += reward
+            if terminal:
+                break
+        node = path[reached]
+
+        # expansion, unless another thread expanded the leaf meanwhile
+        if not terminal:
+            with self._lock:
+                if not node.children:
+                    node.children = [Node(node, a) for a in combinations(state.action_space)]
+                    random.shuffle(node.children)
+
+        if not terminal:
+            sum_reward += self._rollout(state, reached)
+
+        # backpropagate from the deepest node reached, nodes selected past a terminal state only stop pending
+        with self._lock:
+            for n in path:
+                n.pending -= 1
+            for n, reward_before in zip(path[:reached + 1], before):
+                n.visits += 1
+                n.value += sum_reward - reward_before
 
 
 class Runner:
-    def __init__(self, rec_dir, env_name, loops=300, max_depth=1000, playouts=10000):
+    """
+    Plays loops episodes of env_name, choosing every action with an Mcts search of playouts playouts
+    open_loop - the original mode instead: one search of playouts playouts from the reset state per episode,
+            the actions of its best playout are replayed without searching again
+    env - optional environment to run instead of gym.make(env_name)
+    make_env, num_workers - search with RootParallelMcts on num_workers processes, see there
+    parallel - 'root' for RootParallelMcts or 'tree' for TreeParallelMcts on num_workers threads, which
+            is not expected to be faster than the serial search for pure Python environments (the GIL)
+    reuse_tree - every search continues from the subtree of the action committed before (Mcts.advance),
+            a root parallel search starts new trees in its workers anyway
+    compact - search serially with CompactMcts
+    """
+
+    def __init__(self, rec_dir, env_name, loops=300, max_depth=1000, playouts=10000, env=None, make_env=None,
+                 num_workers=0, parallel='root', reuse_tree=True, compact=False, open_loop=False):
+        assert parallel in ('root', 'tree')
         self.env_name = env_name
         self.dir = rec_dir+'/'+env_name
+        self.env = env
+        self.make_env = make_env
+        self.num_workers = num_workers
+        self.parallel = parallel
+        self.reuse_tree = reuse_tree
+        self.compact = compact
+        self.open_loop = open_loop
 
         self.loops = loops
         self.max_depth = max_depth
@@ -62,97 +767,107 @@ class Runner:
     def run(self):
         best_rewards = []
         start_time = time()
-        env = gym.make(self.env_name)
-        
-        # TODO monitor 
+        env = gym.make(self.env_name) if self.env is None else self.env
+
+        # TODO monitor
         # env.monitor.start(self.dir)
 
         logging.info('running enviornment {}'.format(self.env_name))
 
+        if self.open_loop:
+            search = None
+        elif self.num_workers > 0:
+            parallel_mcts = RootParallelMcts if self.parallel == 'root' else TreeParallelMcts
+            search = parallel_mcts(self.make_env, self.num_workers, max_depth=self.max_depth)
+            decide = (lambda: search.search(env, self.playouts))
+        else:
+            search = (CompactMcts if self.compact else Mcts)(env, max_depth=self.max_depth)
+            decide = (lambda: search.search(self.playouts))
+        reuse_tree = self.reuse_tree and isinstance(search, Mcts)
         for loop in range(self.loops):
             env.reset()
-            root = Node(None, None)
-
-            best_actions = []
-            best_reward = float("-inf")
-
-            for _ in range(self.playouts):
-                state = copy(env)
-                
-                # TODO monitor
-                #del state._monitor
-
-                sum_reward = 0
-                node = root
-                terminal = False
-                actions = []
-
-                # selection
-                while node.children:
-                    if node.explored_children < len(node.children):
-                        child = node.children[node.explored_children]
-                        node.explored_children += 1
-                        node = child
-                    else:
-                        node = max(node.children, key=ucb)
-                    _, reward, terminal, _ = state.step(node.action)
-                    sum_reward += reward
-                    actions.append(node.action)
-                    # moshe
-                    if terminal:
-                        state.reset()
-                        break
+            if reuse_tree:
+                search.reset()
 
-                # expansion
-                if not terminal:
-                    node.children = [Node(node, a) for a in combinations(state.action_space)]
-                    random.shuffle(node.children)
-
-                # playout
-                while not terminal:
-                    action = state.action_space.sample()
-                    _, reward, terminal, _ = state.step(action)
+            sum_reward = 0
+            terminal = False
+            if self.open_loop:
+                for action in self._plan_open_loop(env):
+                    _, reward, terminal, _ = env.step(action)
                     sum_reward += reward
-                    actions.append(action)
-
-                    if len(actions) > self.max_depth:
-                        sum_reward -= 100
+                    if terminal:
                         break
-                #moshe
-                if terminal:
-                    state.reset()
-                # remember best
-                if best_reward < sum_reward:
-                    best_reward = sum_reward
-                    best_actions = actions
-
-                # backpropagate
-                while node:
-                    node.visits += 1
-                    node.value += sum_reward
-                    node = node.parent
-
-                # fix monitors not being garbage collected
-                # TODO monitor
-                # del state._monitor
-
-            sum_reward = 0
-            for action in best_actions:
+            while not terminal and not self.open_loop:
+                action = decide()
                 _, reward, terminal, _ = env.step(action)
                 sum_reward += reward
-                if terminal:
-                    # moshe
-                    # env.reset()
-                    break
+                if reuse_tree:
+                    search.advance(action)
 
             best_rewards.append(sum_reward)
             score = max(moving_average(best_rewards, 100))
             avg_time = (time()-start_time)/(loop+1)
             self.print_stats(loop+1, score, avg_time)
+        if isinstance(search, RootParallelMcts):
+            search.close()
         # TODO monitor
         #env.monitor.close()
         print
 
+    def _plan_open_loop(self, env):
+        # playouts on copies of env from one new tree, returns the actions of the playout of highest return
+        root = Node(None, None)
+        best_actions = []
+        best_reward = float('-inf')
+        for _ in range(self.playouts):
+            state = copy(env)
+            sum_reward = 0
+            node = root
+            terminal = False
+            actions = []
+
+            # selection
+            while node.children:
+                if node.explored_children < len(node.children):
+                    child = node.children[node.explored_children]
+                    node.explored_children += 1
+                    node = child
+                else:
+                    node = max(node.children, key=ucb)
+                _, reward, terminal, _ = state.step(node.action)
+                sum_reward += reward
+                actions.append(node.action)
+                if terminal:
+                    break
+
+            # expansion
+            if not terminal:
+                node.children = [Node(node, a) for a in combinations(state.action_space)]
+                random.shuffle(node.children)
+
+            # playout
+            while not terminal:
+                action = state.action_space.sample()
+                _, reward, terminal, _ = state.step(action)
+                sum_reward += reward
+                actions.append(action)
+
+                if len(actions) > self.max_depth:
+                    sum_reward -= 100
+                    break
+
+            # remember best
+            if best_reward < sum_reward:
+                best_reward = sum_reward
+                best_actions = actions
+
+            # backpropagate
+            while node:
+                node.visits += 1
+                node.value += sum_reward
+                node = node.parent
+        return best_actions
+
 
 def main():
     # get rec_dir
@@ -166,19 +881,19 @@ def main():
     logging.info("rec_dir: {}".format(rec_dir))
 
     #control
-    Runner(rec_dir, 'CartPole-v1',   loops=1000, playouts=4000, max_depth=50).run()
+    Runner(rec_dir, 'CartPole-v1',   loops=1000, playouts=4000, max_depth=50, open_loop=True).run()
 
     # # Toy text
-    # Runner(rec_dir, 'Taxi-v1',   loops=100, playouts=4000, max_depth=50).run()
-    # Runner(rec_dir, 'NChain-v0', loops=100, playouts=3000, max_depth=50).run()
+    # Runner(rec_dir, 'Taxi-v1',   loops=100, playouts=4000, max_depth=50, open_loop=True).run()
+    # Runner(rec_dir, 'NChain-v0', loops=100, playouts=3000, max_depth=50, open_loop=True).run()
 
     # # Algorithmic
-    # Runner(rec_dir, 'Copy-v0').run()
-    # Runner(rec_dir, 'RepeatCopy-v0').run()
-    # Runner(rec_dir, 'DuplicatedInput-v0').run()
-    # Runner(rec_dir, 'ReversedAddition-v0').run()
-    # Runner(rec_dir, 'ReversedAddition3-v0').run()
-    # Runner(rec_dir, 'Reverse-v0').run()
+    # Runner(rec_dir, 'Copy-v0', open_loop=True).run()
+    # Runner(rec_dir, 'RepeatCopy-v0', open_loop=True).run()
+    # Runner(rec_dir, 'DuplicatedInput-v0', open_loop=True).run()
+    # Runner(rec_dir, 'ReversedAddition-v0', open_loop=True).run()
+    # Runner(rec_dir, 'ReversedAddition3-v0', open_loop=True).run()
+    # Runner(rec_dir, 'Reverse-v0', open_loop=True).run()
 
 
 if __name__ == "__main__":
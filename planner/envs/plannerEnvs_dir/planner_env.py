@@ -37,6 +37,11 @@ def point_to_pos(point: Point) -> Pos:
     return Pos(point.x, point.y, point.z)
 
 
+def points_to_positions(points) -> list:
+    # one projection call for all points
+    return Pos.from_lat_lon_alt([(point.x, point.y, point.z) for point in points])
+
+
 def pos_to_point(pos: Pos) -> Point:
     lon, lat, alt = pos.toLongLatAlt()
     return Point(x=lat, y=lon, z=alt)
@@ -64,13 +69,16 @@ class PlannerEnv(gym.Env):
             self.cep = n_enn.cep
             # self.gpoint = Point(x=40.0, y=-23.0, z=0.044715006)
             self.gpoint = n_enn.gpoint
-            self._pos = point_to_pos(n_enn.gpoint)
+            # converted lazily, see PlannerEnv.update_positions
+            self._pos = None
             self.priority = n_enn.priority
             self.tclass = n_enn.tclass
             self.is_alive = n_enn.is_alive
 
         @property
         def pos(self):
+            if self._pos is None:
+                self._pos = point_to_pos(self.gpoint)
             return self._pos
 
     class Entity:
@@ -91,6 +99,8 @@ class PlannerEnv(gym.Env):
 
         @property
         def pos(self):
+            if self._pos is None:
+                self._pos = point_to_pos(self.gpoint)
             return self._pos
             # return point_to_pos(self.gpoint)
 
@@ -99,7 +109,8 @@ class PlannerEnv(gym.Env):
 
         def update_gpose(self, n_pose):
             self.gpoint = Point(x=n_pose.y, y=n_pose.x, z=n_pose.z)
-            self._pos = point_to_pos(self.gpoint)
+            # converted lazily, see PlannerEnv.update_positions
+            self._pos = None
 
         def update_imu(self, n_imu):
             self.imu = n_imu
@@ -364,7 +375,15 @@ class PlannerEnv(gym.Env):
         # check paths?
         return obs
 
+    def update_positions(self):
+        # convert all poses received since the last update with a single projection call
+        stale = [elem for elem in self.entities + self.enemies if elem._pos is None]
+        if bool(stale):
+            for elem, pos in zip(stale, points_to_positions([elem.gpoint for elem in stale])):
+                elem._pos = pos
+
     def update_state(self):
+        self.update_positions()
         entities = self.entities
         enemies = self.enemies
         line_of_sight_mesh = self.compute_all_los()
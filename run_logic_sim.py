@@ -4,6 +4,8 @@ import random
 import copy
 import logging
 import sys
+import argparse
+from functools import partial
 from logic_simulator.suicide_drone import SuicideDrone
 from logic_simulator.sensor_drone import SensorDrone
 from logic_simulator.drone import Drone
@@ -11,27 +13,31 @@ from logic_simulator.ugv import Ugv
 from logic_simulator.pos import Pos
 from logic_simulator.logic_sim import LogicSim
 from logic_simulator.enemy import Enemy
+from logic_simulator.scenario_farm import ScenarioFarm
+from logic_simulator.sweep import Sweep, grid, random_search
+from mcts.mcts import Mcts, CompactMcts, RootParallelMcts, TreeParallelMcts, TranspositionTable
+from mcts.logic_sim_env import LogicSimSearchEnv, macro_actions
 
 LOGGER_LEVEL = logging.INFO
 
 
 Ugv.paths = {
-        'Path1': [Pos(-47.0, -359.0, 1.00792499),
-                  Pos(-49.0, -341.0, 1.04790355),
-                  Pos(-29.0, -295.0, 0.40430533),
-                  Pos(-17.0, -250.0, 1.06432373),
-                  Pos(14.0, -180.0, 0.472875877),
-                  Pos(22.0, -137.0, 1.80694756),
-                  Pos(21.0, -98.0, 0.002950645),
-                  Pos(19.0, -78.0, - 0.194334967),
-                  Pos(17.0, -72.0, - 0.000997688),
-                  Pos(19.0, -71.0, - 0.194334959)
-                  ],
-        'Path2': [Pos(19.0, -72.0, - 0.194336753),
-                  Pos(26.0, -62.0, - 0.001001044),
-                  Pos(26.0, -54.0, - 0.001001044),
-                  Pos(27.0, -54.0, - 0.001000144)
-                  ]
+        'Path1': Pos.from_lat_lon_alt([(-47.0, -359.0, 1.00792499),
+                                       (-49.0, -341.0, 1.04790355),
+                                       (-29.0, -295.0, 0.40430533),
+                                       (-17.0, -250.0, 1.06432373),
+                                       (14.0, -180.0, 0.472875877),
+                                       (22.0, -137.0, 1.80694756),
+                                       (21.0, -98.0, 0.002950645),
+                                       (19.0, -78.0, - 0.194334967),
+                                       (17.0, -72.0, - 0.000997688),
+                                       (19.0, -71.0, - 0.194334959)
+                                       ]),
+        'Path2': Pos.from_lat_lon_alt([(19.0, -72.0, - 0.194336753),
+                                       (26.0, -62.0, - 0.001001044),
+                                       (26.0, -54.0, - 0.001001044),
+                                       (27.0, -54.0, - 0.001000144)
+                                       ])
     }
 
     
@@ -55,6 +61,23 @@ TIME_TO_STIMULATE_2 = LogicSim.MAX_STEPS / 2
 SUICIDE_WPS = [NORTH_WEST_SUICIDE, NORTH_EAST_SUICIDE]
 OBSERVER_WPS = [NORTH_EAST_OBSERVER, SOUTH_EAST]
 ENEMY_POS = Pos(48.0, -58.0, 3.47494173)
+MINMUM_DISTANCE = 6.0
+
+# module globals a sweep configuration may override, see play_ambush_config
+AMBUSH_PARAMETERS = ('TIME_TO_STIMULATE_1', 'TIME_TO_STIMULATE_2', 'MINMUM_DISTANCE', 'SUICIDE_WPS', 'OBSERVER_WPS')
+DEFAULT_SWEEP_SPACE = {
+    'TIME_TO_STIMULATE_1': [LogicSim.MAX_STEPS / 8, LogicSim.MAX_STEPS / 4, LogicSim.MAX_STEPS / 3],
+    'TIME_TO_STIMULATE_2': [LogicSim.MAX_STEPS / 2, 2 * LogicSim.MAX_STEPS / 3],
+    'MINMUM_DISTANCE': [4.0, 6.0, 8.0],
+    'SUICIDE_WPS': [SUICIDE_WPS, list(reversed(SUICIDE_WPS))],
+}
+
+# named targets of the ambush macro actions, see search_ambush
+AMBUSH_WAYPOINTS = {'NORTH_WEST_SUICIDE': NORTH_WEST_SUICIDE, 'NORTH_EAST_SUICIDE': NORTH_EAST_SUICIDE,
+                    'NORTH_EAST_OBSERVER': NORTH_EAST_OBSERVER, 'SOUTH_EAST': SOUTH_EAST}
+AMBUSH_LOOK_TARGETS = {'WEST_WINDOW_POS': WEST_WINDOW_POS, 'NORTH_WINDOW_POS': NORTH_WINDOW_POS,
+                       'SOUTH_WINDOW_POS': SOUTH_WINDOW_POS, 'EAST_WINDOW_POS': EAST_WINDOW_POS}
+AMBUSH_ATTACK_TARGETS = {'ENEMY_POS': ENEMY_POS, 'WEST_WINDOW_POS': WEST_WINDOW_POS}
 
 def add_action(actions, entity, action_name, params):
     if not action_name in actions.keys():
@@ -63,7 +86,6 @@ def add_action(actions, entity, action_name, params):
 
 
 def is_entity_positioned(entity, pos):
-    MINMUM_DISTANCE = 6.0
     return entity.pos.distance_to(pos) < MINMUM_DISTANCE
 
 def order_drones_movement(actions, suicide_drone, sensor_drone, plan_index):
@@ -101,17 +123,33 @@ def line_of_sight_to_enemy(entities):
     return [ent for ent in entities if line_of_sight(ent, ENEMY_POS)]
   
 
-def simple_building_ambush():
-    logging.debug('start simple_building_ambush ...')
+def make_ambush_sim():
     sensor_drone = SensorDrone('SensorDrone', SENSOR_DRONE_START_POS)
     suicide_drone = SuicideDrone('Suicide', SUICIDE_DRONE_START_POS)
     ugv = Ugv('UGV', UGV_START_POS)
     enemy_positions = [ENEMY_POS]
     enemies = [Enemy("Enemy" + str(i), p, 1) for i,p in enumerate(enemy_positions)]
-    ls = LogicSim({suicide_drone.id: suicide_drone, sensor_drone.id:sensor_drone, ugv.id:ugv}, enemies)
+    return LogicSim({suicide_drone.id: suicide_drone, sensor_drone.id:sensor_drone, ugv.id:ugv}, enemies)
+
+
+def simple_building_ambush():
+    logging.debug('start simple_building_ambush ...')
+    ls = make_ambush_sim()
     ls.reset()
+    return play_ambush(ls)
+
+
+def play_ambush(ls, render=True):
+    """
+    Play the ambush plan on a reset LogicSim built by make_ambush_sim
+    returns total reward, steps, number of dead enemies, number of lost entities
+    """
+    entities = {e.id: e for e in ls.entities}
+    sensor_drone, suicide_drone, ugv = entities['SensorDrone'], entities['Suicide'], entities['UGV']
+    enemies = ls.enemies
     step, start_ambush_step, stimulation_1_step, stimulation_2_step, plan_index = 0, 0, 0, 0, 0
     done, all_entities_positioned = False, False
+    total_reward = 0.0
 
     while step < LogicSim.MAX_STEPS and not done:
         step += 1
@@ -166,11 +204,124 @@ def simple_building_ambush():
                     add_action(actions, ugv, 'TAKE_PATH', ('Path2', GATE_POS))
             plan_index = order_drones_movement(actions, suicide_drone, sensor_drone, plan_index)
             order_drones_look_at(actions, suicide_drone, sensor_drone)
-        ls.render()
+        if render:
+            ls.render()
         obs, reward, done, _ =  ls.step(actions)
+        total_reward += reward
         # print (obs)
-        logging.debug('obs = {}, reward = {}, done = {}'.format(obs,reward,done))
+        logging.debug('obs = %s, reward = %s, done = %s', obs, reward, done)
     logging.info("step {} done {} reward {} enemy alive {}".format(step, done, reward, enemies[0]._health > 0.0))
+    num_of_dead = len([enemy for enemy in enemies if not enemy.is_alive])
+    num_of_lost_devices = len([e for e in ls.entities if e.health == 0.0])
+    return total_reward, step, num_of_dead, num_of_lost_devices
+
+
+def make_ambush_search_env(sim=None, ticks_per_action=10):
+    """
+    LogicSimSearchEnv of the ambush macro actions, of a new make_ambush_sim LogicSim if sim is not given
+    """
+    if sim is None:
+        sim = make_ambush_sim()
+        sim.reset()
+    macros = macro_actions(sim, AMBUSH_WAYPOINTS, AMBUSH_LOOK_TARGETS, AMBUSH_ATTACK_TARGETS)
+    return LogicSimSearchEnv(sim, macros, ticks_per_action=ticks_per_action)
+
+
+def search_ambush(ls, playouts=1000, ticks_per_action=10, max_depth=10, time_budget=None, render=True,
+                  num_workers=0, parallel='root', transpositions=0, widening=None, reuse_tree=True,
+                  compact=False):
+    """
+    Play an episode on a reset LogicSim built by make_ambush_sim, every ticks_per_action ticks
+    committing the action an Mcts search of playouts playouts chose
+    num_workers - search root parallel on this many processes, each running playouts playouts,
+            or with parallel='tree' on this many threads sharing one tree of playouts playouts. The threads
+            share the GIL, a tree parallel search runs about as many playouts per second as a serial one
+    transpositions - capacity of the transposition table of a serial or root parallel search, 0 for none
+    widening - (k, alpha) progressive widening of a serial or root parallel search over continuous
+            MOVE_TO / LOOK_AT targets around the named ones, None searches the macro actions only
+    reuse_tree - every search of a serial or tree parallel search continues from the subtree of the
+            action committed before
+    compact - search serially with CompactMcts, its nodes in arrays, without widening
+    returns total reward, steps, number of dead enemies, number of lost entities as play_ambush
+    """
+    env = make_ambush_search_env(ls, ticks_per_action)
+    table = TranspositionTable(transpositions) if transpositions > 0 else None
+    make_env = partial(make_ambush_search_env, ticks_per_action=ticks_per_action)
+    if num_workers > 0 and parallel == 'root':
+        search = RootParallelMcts(make_env, num_workers, max_depth=max_depth, depth_penalty=0.0, transpositions=table,
+                                  widening=widening)
+        decide = (lambda: search.search(env, playouts, time_budget))
+    elif num_workers > 0:
+        search = TreeParallelMcts(make_env, num_workers, max_depth=max_depth, depth_penalty=0.0)
+        decide = (lambda: search.search(env, playouts, time_budget))
+    elif compact:
+        assert widening is None, 'CompactMcts does not widen'
+        search = CompactMcts(env, max_depth=max_depth, depth_penalty=0.0, transpositions=table)
+        decide = (lambda: search.search(playouts, time_budget))
+    else:
+        search = Mcts(env, max_depth=max_depth, depth_penalty=0.0, transpositions=table, widening=widening)
+        decide = (lambda: search.search(playouts, time_budget))
+    reuse_tree = reuse_tree and isinstance(search, Mcts)
+    total_reward, done = 0.0, False
+    while not done:
+        env.sync(ls)
+        action = decide()
+        logging.info('step %s %s', ls.step_count, env.action_name(action))
+        actions = env.actions_of(action)
+        ticks = 0
+        while not done and ticks < ticks_per_action:
+            if render:
+                ls.render()
+            _, reward, done, _ = ls.step(actions if ticks == 0 else {})
+            total_reward += reward
+            ticks += 1
+        if reuse_tree:
+            search.advance(action)
+    if num_workers > 0 and parallel == 'root':
+        search.close()
+    num_of_dead = len([enemy for enemy in ls.enemies if not enemy.is_alive])
+    num_of_lost_devices = len([e for e in ls.entities if e.health == 0.0])
+    return total_reward, ls.step_count, num_of_dead, num_of_lost_devices
+
+
+def run_batch(num_episodes, num_workers=None, seed=0):
+    """
+    Play num_episodes ambush episodes on a process pool, see logic_simulator.scenario_farm
+    """
+    farm = ScenarioFarm(make_ambush_sim, partial(play_ambush, render=False), num_workers=num_workers, seed=seed)
+    stats = farm.run(num_episodes, callback=lambda r: logging.warning(
+        'episode %s reward %s steps %s dead %s lost %s', r.episode, r.reward, r.steps, r.dead, r.lost))
+    return stats
+
+
+def play_ambush_config(config, ls):
+    """
+    play_ambush with the AMBUSH_PARAMETERS globals set from config
+    """
+    module = globals()
+    assert all(name in AMBUSH_PARAMETERS for name in config.keys()), \
+        'config may only set {}'.format(AMBUSH_PARAMETERS)
+    saved = {name: module[name] for name in config.keys()}
+    module.update(config)
+    try:
+        return play_ambush(ls, render=False)
+    finally:
+        module.update(saved)
+
+
+def sweep_ambush(space=None, episodes=100, num_workers=None, seed=0, cache_path=None, num_samples=None):
+    """
+    Evaluate the grid (or num_samples random configurations) of space over seeded ambush episodes
+    returns list of (config, summary), see logic_simulator.sweep
+    """
+    space = DEFAULT_SWEEP_SPACE if space is None else space
+    configs = grid(space) if num_samples is None else random_search(space, num_samples, seed)
+    sweep = Sweep(make_ambush_sim, play_ambush_config, episodes=episodes, num_workers=num_workers, seed=seed,
+                  cache_path=cache_path)
+    return sweep.run(configs, callback=lambda config, summary: logging.warning(
+        'config %s steps %s dead %s lost %s', config, summary['steps']['mean'], summary['dead']['mean'],
+        summary['lost']['mean']))
+
 def get_new_target(old_target):
     assert not old_target is None
     offset_axis = [np.array([1.0,0.0,0.0]), np.array([0.0,1.0,0.0])]
@@ -228,7 +379,46 @@ def configure_logger():
     return root
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--episodes', type=int, default=0,
+                        help='Number of episodes to play in batch mode, 0 plays a single rendered episode')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Batch mode processes, defaults to all cores. Root parallel search processes with --playouts')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the first batch episode')
+    parser.add_argument('--sweep', action='store_true',
+                        help='Evaluate DEFAULT_SWEEP_SPACE over --episodes episodes per configuration')
+    parser.add_argument('--samples', type=int, default=None, help='Sweep random configurations instead of the grid')
+    parser.add_argument('--sweep-cache', type=str, default='ambush_sweep.jsonl', help='Sweep results cache file')
+    parser.add_argument('--playouts', type=int, default=0,
+                        help='Plan the rendered episode with an MCTS search of this many playouts per decision')
+    parser.add_argument('--parallel', choices=['root', 'tree'], default='root',
+                        help='Parallel search of --playouts with --workers, root (processes) or tree (threads, '
+                             'which share the GIL and are not expected to search faster than serial)')
+    parser.add_argument('--transpositions', type=int, default=0,
+                        help='Transposition table capacity of the --playouts search, 0 for none')
+    parser.add_argument('--widening', type=float, nargs=2, default=None, metavar=('K', 'ALPHA'),
+                        help='Progressive widening of the --playouts search over continuous targets')
+    parser.add_argument('--compact', action='store_true',
+                        help='Serial --playouts search on array backed nodes')
+    args = parser.parse_args()
     # test_logic_sim()
     root = configure_logger()
-    root.setLevel(LOGGER_LEVEL)
-    simple_building_ambush()
\ No newline at end of file
+    if args.sweep:
+        root.setLevel(logging.WARNING)
+        results = sweep_ambush(episodes=max(args.episodes, 1), num_workers=args.workers, seed=args.seed,
+                               cache_path=args.sweep_cache, num_samples=args.samples)
+        print('best', Sweep.best(results, field='dead'))
+    elif args.episodes > 0:
+        # per step logging of thousands of episodes would dominate the run
+        root.setLevel(logging.WARNING)
+        print(run_batch(args.episodes, args.workers, args.seed))
+    elif args.playouts > 0:
+        root.setLevel(LOGGER_LEVEL)
+        ls = make_ambush_sim()
+        ls.reset()
+        print(search_ambush(ls, playouts=args.playouts, num_workers=args.workers or 0,
+                            parallel=args.parallel, transpositions=args.transpositions,
+                            widening=args.widening, compact=args.compact))
+    else:
+        root.setLevel(LOGGER_LEVEL)
+        simple_building_ambush()
\ No newline at end of file
@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+from logic_simulator.enemy import Enemy
+from logic_simulator.logic_sim import LogicSim
+from logic_simulator.pos import Pos
+from logic_simulator.sensor_drone import SensorDrone
+from logic_simulator.suicide_drone import SuicideDrone
+from logic_simulator.ugv import Ugv
+
+ENEMY_POS = Pos.from_xyz(1000, 1000, 0)
+
+
+@pytest.fixture(autouse=True)
+def paths(monkeypatch):
+    monkeypatch.setattr(Ugv, 'paths', {'A': [Pos.from_xyz(990, 1000 + 10 * i, 0) for i in range(5)],
+                                       'B': [Pos.from_xyz(990 - 10 * i, 1000, 0) for i in range(5)]})
+
+
+def make_sim(seed):
+    enemies = [Enemy('E', Pos.from_xyz(1000, 1000, 0), 1), Enemy('E2', Pos.from_xyz(1002, 1000, 0), 2)]
+    entities = [SuicideDrone('S', Pos.from_xyz(1030, 1000, 10)), SensorDrone('D', Pos.from_xyz(1000, 1030, 20)),
+                Ugv('U', Pos.from_xyz(990, 1000, 0))]
+    sim = LogicSim({e.id: e for e in entities}, enemies, seed=seed)
+    sim.reset()
+    return sim
+
+
+def actions(i):
+    a = {'LOOK_AT': [{'D': (ENEMY_POS,)}],
+         'TAKE_PATH': [{'U': ('A' if i < 10 else 'B', Pos.from_xyz(950, 1000, 0))}]}
+    if i > 2:
+        a['ATTACK'] = [{'S': (ENEMY_POS,)}]
+    return a if i % 3 else {}
+
+
+def run(sim, first, last):
+    snapshots = []
+    for i in range(first, last):
+        sim.step(actions(i))
+        snapshots.append(sim.snapshot().copy())
+    return np.array(snapshots)
+
+
+def make_far_sim(seed):
+    # entities start away from the enemy, step_to_event skips the ticks of their transits
+    enemy = Enemy('E', Pos.from_xyz(1000, 1000, 0), 1)
+    entities = [SuicideDrone('S', Pos.from_xyz(1080 + 5 * seed, 1000, 10)),
+                SensorDrone('D', Pos.from_xyz(1000, 1100, 20)), Ugv('U', Pos.from_xyz(990, 1000, 0))]
+    sim = LogicSim({e.id: e for e in entities}, [enemy], seed=seed)
+    sim.reset()
+    return sim
+
+
+FAR_ACTIONS = {'MOVE_TO': [{'D': (Pos.from_xyz(1000, 1010, 20),)}], 'LOOK_AT': [{'D': (ENEMY_POS,)}],
+               'TAKE_PATH': [{'U': ('A', Pos.from_xyz(990, 1040, 0))}], 'ATTACK': [{'S': (ENEMY_POS,)}]}
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_step_to_event_matches_steps(seed):
+    sim = make_far_sim(seed)
+    expected = {}
+    for i in range(LogicSim.MAX_STEPS):
+        sim.step(FAR_ACTIONS if i == 0 else {})
+        expected[sim.step_count] = sim.snapshot().copy()
+
+    sim = make_far_sim(seed)
+    calls = 0
+    while not sim.is_done():
+        _, _, _, info = sim.step_to_event(FAR_ACTIONS if calls == 0 else {})
+        calls += 1
+        assert info['ticks'] >= 1
+        np.testing.assert_allclose(sim.snapshot(), expected[sim.step_count], rtol=0, atol=1e-9)
+    assert calls < LogicSim.MAX_STEPS
+
+
+def test_snapshot_restore_round_trip():
+    sim = make_sim(3)
+    run(sim, 0, 5)
+    snapshot = sim.snapshot().copy()
+    rng_state = sim.rng.bit_generator.state
+    first = run(sim, 5, 60)
+
+    sim.restore(snapshot)
+    sim.rng.bit_generator.state = rng_state
+    np.testing.assert_array_equal(sim.snapshot(), snapshot)
+    np.testing.assert_array_equal(run(sim, 5, 60), first)
+
+    sim.restore(snapshot)
+    sim.rng.bit_generator.state = rng_state
+    clone = sim.clone()
+    np.testing.assert_array_equal(run(clone, 5, 60), first)
+    # the clone does not share state with the simulator it was made from
+    np.testing.assert_array_equal(sim.snapshot(), snapshot)
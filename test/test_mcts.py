@@ -0,0 +1,66 @@
+import random
+import gym
+import numpy as np
+import pytest
+from mcts.mcts import Mcts, CompactMcts, TranspositionTable
+
+
+class ChainEnv(gym.Env):
+    # reward 1 for the action matching the step modulo the number of actions, transpositions by (step, score)
+    action_space = gym.spaces.Discrete(4)
+
+    def __init__(self, length=6):
+        self._length = length
+        self._t = 0
+        self._score = 0
+
+    def reset(self):
+        self._t, self._score = 0, 0
+        return self._t
+
+    def snapshot(self):
+        return self._t, self._score
+
+    def restore(self, snapshot):
+        self._t, self._score = snapshot
+
+    def state_key(self):
+        return self._t, self._score
+
+    def step(self, action):
+        reward = float(action == self._t % self.action_space.n)
+        self._t += 1
+        self._score += reward
+        return self._t, reward, self._t >= self._length, {}
+
+
+def searched_stats(cls, transpositions, seed=0):
+    random.seed(seed)
+    env = ChainEnv()
+    env.action_space.seed(seed)
+    search = cls(env, max_depth=10, transpositions=TranspositionTable(100) if transpositions else None)
+    stats = []
+    action = search.search(200)
+    stats.append((action, search.root_stats()))
+    env.step(action)
+    search.advance(action)
+    action = search.search(100)
+    stats.append((action, search.root_stats()))
+    return stats
+
+
+@pytest.mark.parametrize('transpositions', [False, True])
+def test_compact_mcts_matches_mcts(transpositions):
+    assert searched_stats(CompactMcts, transpositions) == searched_stats(Mcts, transpositions)
+
+
+def test_compact_mcts_grows_its_store():
+    random.seed(0)
+    env = ChainEnv()
+    search = CompactMcts(env, max_depth=10, capacity=4)
+    search.search(100)
+    assert len(search.nodes) > 4
+    assert search.nodes.capacity >= len(search.nodes)
+    assert search.nodes.visits[search.root] == 100
+    # the first playout only expands the root
+    assert np.sum([search.nodes.visits[n] for n in search.nodes.children(search.root)]) == 99
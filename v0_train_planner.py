@@ -67,22 +67,22 @@ LOG_STD_MIN = -20
 
 lg_ugv.paths = {
 
-    'Path1': [Pos(29.9968816, 32.9994866, 1.75025599),
-              Pos(29.9969181, 32.9994912, 2.30123867),
-              Pos(29.9973316, 32.9996937, 1.02103409),
-              Pos(29.9977419, 32.9998162, 2.34626527),
-              Pos(29.9983693, 33.0001438, 1.14929717),
-              Pos(29.9987616, 33.0002219, 3.81971129),
-              Pos(29.9991068, 33.0002142, 0.213150453),
-              Pos(29.9992864, 33.0001952, -0.182928821),
-              Pos(29.9993341, 33.0001884, -0.180931998),
-              Pos(29.9993667, 33.0002117, -0.18193179)
-              ],
-    'Path2': [Pos(29.9993825, 33.0002122, -0.390682418),
-              Pos(29.9995118, 33.0002082, -0.390672229),
-              Pos(29.9995114, 33.0002533, -0.390669329),
-              Pos(29.999509, 33.0002783, -0.00499354924)
-              ]
+    'Path1': Pos.from_lat_lon_alt([(29.9968816, 32.9994866, 1.75025599),
+                                   (29.9969181, 32.9994912, 2.30123867),
+                                   (29.9973316, 32.9996937, 1.02103409),
+                                   (29.9977419, 32.9998162, 2.34626527),
+                                   (29.9983693, 33.0001438, 1.14929717),
+                                   (29.9987616, 33.0002219, 3.81971129),
+                                   (29.9991068, 33.0002142, 0.213150453),
+                                   (29.9992864, 33.0001952, -0.182928821),
+                                   (29.9993341, 33.0001884, -0.180931998),
+                                   (29.9993667, 33.0002117, -0.18193179)
+                                   ]),
+    'Path2': Pos.from_lat_lon_alt([(29.9993825, 33.0002122, -0.390682418),
+                                   (29.9995118, 33.0002082, -0.390672229),
+                                   (29.9995114, 33.0002533, -0.390669329),
+                                   (29.999509, 33.0002783, -0.00499354924)
+                                   ])
 }
 
 UGV_START_POS = Pos(29.996738, 32.9995218, 1.01453949)
@@ -852,30 +852,30 @@ def add_arguments(parser):
     #                     help='Optional keyword argument to pass to the env constructor')
 
 
-def string_positions_list(str_list):
-    l = len(str_list)
-    assert l % 3 == 0
-    positions = []
-    for i in range(int(l / 3)):
-        positions.append(Pos(float(str_list[i * 3]), float(str_list[i * 3 + 1]), float(str_list[i * 3 + 2])))
-    return positions
-
-
 def read_positions():
     import csv
 
     positions_dict = {}
     irrelevant_keys = ['Ellipse1']
     paths_key = ['Path1', 'Path2']
+    # collect every lat, lon, alt triplet first and project them all with a single call
+    keys, num_of_points, fields = [], [], []
     with open('PlannerPositions.csv', newline='') as csvfile:
         reader = csv.reader(csvfile, delimiter=',', quotechar='|')
         next(reader)
         for row in reader:
             key = row[0]
             if key not in irrelevant_keys:
-                positions_dict[row[0]] = Pos(
-                    float(row[5]), float(row[6]), float(row[7])) if key not in paths_key else string_positions_list(
-                    [field for field in row[5:] if bool(field)])
+                row_fields = row[5:8] if key not in paths_key else [field for field in row[5:] if bool(field)]
+                assert len(row_fields) % 3 == 0
+                keys.append(key)
+                num_of_points.append(len(row_fields) // 3)
+                fields.extend(float(field) for field in row_fields)
+
+    positions = iter(Pos.from_lat_lon_alt(fields))
+    for key, n in zip(keys, num_of_points):
+        key_positions = [next(positions) for _ in range(n)]
+        positions_dict[key] = key_positions[0] if key not in paths_key else key_positions
 
     return positions_dict
 